@@ -0,0 +1,266 @@
+import logging
+import asyncio
+import threading
+import ssl
+import http.client
+import urllib.parse
+from io import BytesIO
+
+import httpclient
+
+
+_LOGGER = logging.getLogger(__name__)
+
+
+USER_AGENT = "Mozilla/5.0 (compatible, MSIE 11, Windows NT 6.3; Trident/7.0; rv:11.0) like Gecko"
+
+## max number of followed redirections of single request (the same as 'requests' library)
+MAX_REDIRECTS = 30
+
+## 307 and 308 repeat request with the same method and body, others are followed with GET
+REDIRECT_STATUSES = ( 301, 302, 303, 307, 308 )
+
+
+# ====================================================================
+
+
+class AsyncioClient( httpclient.HttpClient ):
+    """HTTP/1.1 client based on asyncio streams (no third-party dependencies).
+
+    Coroutines 'get_async()' and 'post_async()' can be awaited in any event loop.
+    Blocking 'get()' and 'post()' run coroutines in client's own loop thread.
+    Idle connections are kept per event loop and host, so they are reused
+    between requests.
+    """
+
+    def __init__(self, pool_size=16, timeout=30):
+        super().__init__()
+        self.pool_size = pool_size
+        self.timeout   = timeout
+        self.new_connections = 0
+        self.reused_connections = 0
+        self._idle = {}                 ## (loop, scheme, host, port) -> list of (reader, writer)
+        self._ssl_context = None
+        self._loop = None
+        self._loop_thread = None
+
+    def get(self, url, headers=None):
+        return self._run( self.get_async( url, headers ) )
+
+    def post(self, url, data, headers=None):
+        return self._run( self.post_async( url, data, headers ) )
+
+    async def get_async(self, url, headers=None):
+        return await self.request_async( "GET", url, None, headers )
+
+    async def post_async(self, url, data, headers=None):
+        return await self.request_async( "POST", url, data, headers )
+
+    ## return list: [status_code, content, headers]
+    ## redirections are followed (like in other backends), so headers are of last response
+    async def request_async(self, method, url, data=None, headers=None):
+        self._count_request()
+        parsed = urllib.parse.urlsplit( url )
+        if parsed.scheme == "file":
+            return await asyncio.to_thread( read_file_url, parsed )
+        for _ in range( MAX_REDIRECTS ):
+            response = await asyncio.wait_for( self._perform( method, parsed, data, headers ), self.timeout )
+            location = response[2].get( "Location" )
+            if response[0] not in REDIRECT_STATUSES or location is None:
+                return response
+            target = urllib.parse.urlsplit( urllib.parse.urljoin( parsed.geturl(), location ) )
+            _LOGGER.debug( "redirected with status %s to %s", response[0], target.geturl() )
+            if response[0] not in ( 307, 308 ) and method != "HEAD":
+                method = "GET"
+                data   = None
+            if headers and target.netloc != parsed.netloc:
+                ## credentials are not passed to other hosts
+                headers = { name: value for name, value in headers.items() if name.lower() != "authorization" }
+            parsed = target
+        raise http.client.HTTPException( f"exceeded {MAX_REDIRECTS} redirections: {url}" )
+
+    def close(self):
+        with self._stats_lock:
+            idle = self._idle
+            self._idle = {}
+            loop = self._loop
+            self._loop = None
+        for connections in idle.values():
+            for _, writer in connections:
+                writer.transport.abort()
+        if loop is not None:
+            loop.call_soon_threadsafe( loop.stop )
+            self._loop_thread.join()
+            loop.close()
+            self._loop_thread = None
+
+    ## close idle connections of running event loop (connections can't be used after the loop is closed)
+    def close_loop_connections(self):
+        loop = asyncio.get_running_loop()
+        with self._stats_lock:
+            keys = [ key for key in self._idle if key[0] is loop ]
+            connections = [ connection for key in keys for connection in self._idle.pop( key ) ]
+        for _, writer in connections:
+            writer.close()
+
+    def stats(self):
+        return { "requests": self.requests_num,
+                 "new_connections": self.new_connections,
+                 "reused_connections": self.reused_connections }
+
+    ## run coroutine in loop of client (started on first use)
+    def _run(self, coroutine):
+        with self._stats_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._loop_thread = threading.Thread( target=self._loop.run_forever, name="asynchttp", daemon=True )
+                self._loop_thread.start()
+            loop = self._loop
+        return asyncio.run_coroutine_threadsafe( coroutine, loop ).result()
+
+    async def _perform(self, method, parsed, data, headers):
+        key = self._pool_key( parsed )
+        path = parsed.path or "/"
+        if parsed.query:
+            path += "?" + parsed.query
+        request = self._prepare_request( method, parsed.netloc, path, data, headers )
+
+        connection = self._acquire( key )
+        if connection is not None:
+            try:
+                return await self._exchange( key, connection, method, request )
+            except ( ConnectionError, asyncio.IncompleteReadError ):
+                ## server closed idle connection -- repeat on new one
+                _LOGGER.debug( "reused connection closed, reconnecting: %s", parsed.netloc )
+        connection = await self._connect( key )
+        return await self._exchange( key, connection, method, request )
+
+    async def _exchange(self, key, connection, method, request):
+        reader, writer = connection
+        try:
+            writer.write( request )
+            await writer.drain()
+            status, headers, body, keep_alive = await read_response( reader, method )
+        except BaseException:
+            writer.transport.abort()
+            raise
+        if keep_alive:
+            self._release( key, connection )
+        else:
+            writer.close()
+        try:
+            content = body.decode( 'utf8' )
+        except UnicodeDecodeError:
+            ## binary data
+            content = body
+        return [ status, content, headers ]
+
+    def _prepare_request(self, method, host, path, data, headers):
+        request_headers = { "Host": host,
+                            "User-Agent": USER_AGENT,
+                            "Accept": "*/*",
+                            "Connection": "keep-alive" }
+        if headers:
+            request_headers.update( headers )
+        if data is not None:
+            if isinstance( data, str ):
+                data = data.encode( 'utf8' )
+            request_headers[ "Content-Length" ] = str( len( data ) )
+        lines = [ f"{method} {path} HTTP/1.1" ]
+        lines += [ f"{name}: {value}" for name, value in request_headers.items() ]
+        request = ( "\r\n".join( lines ) + "\r\n\r\n" ).encode( 'latin-1' )
+        if data is not None:
+            request += data
+        return request
+
+    def _pool_key(self, parsed):
+        port = parsed.port
+        if port is None:
+            port = 443 if parsed.scheme == "https" else 80
+        return ( asyncio.get_running_loop(), parsed.scheme, parsed.hostname, port )
+
+    def _acquire(self, key):
+        with self._stats_lock:
+            connections = self._idle.get( key )
+            while connections:
+                reader, writer = connections.pop()
+                if writer.is_closing() or reader.at_eof():
+                    continue
+                self.reused_connections += 1
+                return ( reader, writer )
+        return None
+
+    def _release(self, key, connection):
+        with self._stats_lock:
+            connections = self._idle.setdefault( key, [] )
+            if len( connections ) < self.pool_size:
+                connections.append( connection )
+                return
+        connection[1].close()
+
+    async def _connect(self, key):
+        _, scheme, host, port = key
+        ssl_context = None
+        if scheme == "https":
+            if self._ssl_context is None:
+                self._ssl_context = ssl.create_default_context()
+            ssl_context = self._ssl_context
+        connection = await asyncio.open_connection( host, port, ssl=ssl_context )
+        with self._stats_lock:
+            self.new_connections += 1
+        return connection
+
+
+## return tuple: (status, headers, body, keep_alive)
+async def read_response( reader, method ):
+    while True:
+        head = await reader.readuntil( b"\r\n\r\n" )
+        status_line, _, fields = head.partition( b"\r\n" )
+        status = int( status_line.split()[1] )
+        if 100 <= status < 200:
+            ## informational response -- real response follows
+            continue
+        break
+    headers = http.client.parse_headers( BytesIO( fields ) )
+    keep_alive = headers.get( "Connection", "" ).lower() != "close" and status_line.startswith( b"HTTP/1.1" )
+
+    if method == "HEAD" or status in ( 204, 304 ):
+        return ( status, headers, b"", keep_alive )
+    if headers.get( "Transfer-Encoding", "" ).lower() == "chunked":
+        body = await read_chunked( reader )
+        return ( status, headers, body, keep_alive )
+    length = headers.get( "Content-Length" )
+    if length is not None:
+        body = await reader.readexactly( int( length ) )
+        return ( status, headers, body, keep_alive )
+    ## body delimited by closing connection
+    body = await reader.read()
+    return ( status, headers, body, False )
+
+
+async def read_chunked( reader ):
+    chunks = []
+    while True:
+        size_line = await reader.readuntil( b"\r\n" )
+        size = int( size_line.split( b";" )[0].strip(), 16 )
+        if size == 0:
+            ## skip trailers
+            while ( await reader.readuntil( b"\r\n" ) ) != b"\r\n":
+                pass
+            return b"".join( chunks )
+        chunks.append( await reader.readexactly( size ) )
+        await reader.readexactly( 2 )
+
+
+def read_file_url( parsed ):
+    path = urllib.parse.unquote( parsed.path )
+    try:
+        with open( path, 'rb' ) as fp:
+            content = fp.read()
+    except OSError:
+        return [ 404, "", httpclient.make_headers( [] ) ]
+    try:
+        content = content.decode( 'utf8' )
+    except UnicodeDecodeError:
+        pass
+    return [ 200, content, httpclient.make_headers( [ ( "Content-Length", str( len( content ) ) ) ] ) ]
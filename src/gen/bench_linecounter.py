@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+import sys
+import logging
+import argparse
+import subprocess
+import json
+import time
+
+import linecounter
+import loccount
+
+
+_LOGGER = logging.getLogger(__name__)
+
+
+# ====================================================================
+
+
+## return tuple: (cloc json summary or None, duration)
+def run_cloc( directory ):
+    cloc_command = [ "cloc", "--json",
+                     "--exclude-lang=" + ",".join( loccount.EXCLUDE_LANGS ),
+                     "--exclude-dir=" + ",".join( loccount.EXCLUDE_DIRS ),
+                     directory ]
+    start_time = time.perf_counter()
+    try:
+        clocResult = subprocess.run( cloc_command, stdout=subprocess.PIPE, check=False )
+    except FileNotFoundError:
+        return ( None, 0.0 )
+    duration = time.perf_counter() - start_time
+    if clocResult.returncode != 0 or not clocResult.stdout.strip():
+        return ( None, duration )
+    return ( json.loads( clocResult.stdout ), duration )
+
+
+## return tuple: (summary, duration)
+def run_builtin( directory, jobs ):
+    start_time = time.perf_counter()
+    summary = linecounter.count_directory( directory, loccount.EXCLUDE_LANGS, loccount.EXCLUDE_DIRS, jobs )
+    duration = time.perf_counter() - start_time
+    return ( summary, duration )
+
+
+def benchmark( directories, jobs=None, repeat=3 ):
+    results = []
+    for directory in directories:
+        cloc_times = []
+        builtin_times = []
+        cloc_data    = None
+        builtin_data = None
+        for _ in range( repeat ):
+            cloc_data, duration = run_cloc( directory )
+            if cloc_data is not None:
+                cloc_times.append( duration )
+            builtin_data, duration = run_builtin( directory, jobs )
+            builtin_times.append( duration )
+
+        result = { "directory": directory,
+                   "builtin_code": builtin_data[ "SUM" ][ "code" ],
+                   "builtin_time": min( builtin_times ) }
+        if cloc_data is not None:
+            result[ "cloc_code" ] = cloc_data[ "SUM" ][ "code" ]
+            result[ "cloc_time" ] = min( cloc_times )
+            languages = set( cloc_data.keys() ) | set( builtin_data.keys() )
+            languages -= { "header", "SUM" }
+            diff = {}
+            for lang in sorted( languages ):
+                cloc_code    = cloc_data.get( lang, {} ).get( "code", 0 )
+                builtin_code = builtin_data.get( lang, {} ).get( "code", 0 )
+                if cloc_code != builtin_code:
+                    diff[ lang ] = ( cloc_code, builtin_code )
+            result[ "diff" ] = diff
+        results.append( result )
+    return results
+
+
+def print_results( results ):
+    print( "{:<40} {:>10} {:>10} {:>10} {:>10} {:>8}".format( "directory", "cloc", "builtin", "cloc [s]", "bltin [s]", "speedup" ) )
+    for item in results:
+        cloc_time = item.get( "cloc_time" )
+        speedup = ""
+        if cloc_time is not None and item[ "builtin_time" ] > 0:
+            speedup = "{:.1f}x".format( cloc_time / item[ "builtin_time" ] )
+        print( "{:<40} {:>10} {:>10} {:>10} {:>10.3f} {:>8}".format( item[ "directory" ][-40:],
+                                                                    item.get( "cloc_code", "-" ),
+                                                                    item[ "builtin_code" ],
+                                                                    "-" if cloc_time is None else "{:.3f}".format( cloc_time ),
+                                                                    item[ "builtin_time" ],
+                                                                    speedup ) )
+        for lang, values in item.get( "diff", {} ).items():
+            print( "    {}: cloc {} builtin {}".format( lang, values[0], values[1] ) )
+
+
+def main():
+    parser = argparse.ArgumentParser( description='compare built-in line counter with cloc' )
+    parser.add_argument( 'directories', nargs='+', help="directories to count" )
+    parser.add_argument( '-j', '--jobs', type=int, default=None,
+                         help="number of worker processes of built-in counter (default: number of CPUs)" )
+    parser.add_argument( '--repeat', type=int, default=3, help="number of repetitions, best time is taken (default: 3)" )
+    parser.add_argument( '--json', action='store_true', help="print results as JSON" )
+    args = parser.parse_args()
+
+    logging.basicConfig( level=logging.WARNING, stream=sys.stdout )
+    results = benchmark( args.directories, args.jobs, args.repeat )
+    if args.json:
+        print( json.dumps( results, indent=4 ) )
+    else:
+        print_results( results )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+import sys, os
+import logging
+import argparse
+import tempfile
+import zipfile
+import random
+import glob
+import json
+import time
+
+import persist
+
+
+_LOGGER = logging.getLogger(__name__)
+
+SCRIPT_DIR = os.path.dirname(__file__)      ## full path to script's directory
+
+CACHE_DIR = os.path.join( SCRIPT_DIR, os.pardir, os.pardir, "tmp", "cache" )
+
+DEFAULT_CODECS = [ "none", "deflate:1", "deflate", "deflate:9", "bz2", "lzma" ]
+
+
+# ====================================================================
+
+
+## return list of state files stored by scraper (caches of previous runs)
+def find_state_files( cache_dir ):
+    files  = glob.glob( os.path.join( cache_dir, "*.pickle" ) )
+    files += glob.glob( os.path.join( cache_dir, "*.sqlite" ) )
+    return sorted( path for path in files if os.path.getsize( path ) > 0 )
+
+
+## pickle object similar to repositories cache and LOC cache, used when no state files exist
+def generate_state_file( work_dir, repos_num=2000 ):
+    rand = random.Random( 0 )
+    languages = [ "Python", "C++", "Java", "Shell", "CMake", "HTML" ]
+    repos = {}
+    loc_counts = {}
+    for index in range( repos_num ):
+        name = f"repo{index:05d}"
+        repos[ name ] = { "name": name,
+                          "category": rand.choice( languages ),
+                          "description": " ".join( rand.choice( languages ) for _ in range( 8 ) ),
+                          "created_at": f"20{10 + index % 14}-01-01T00:00:00Z",
+                          "pushed_at": "2024-01-01T00:00:00Z",
+                          "stars": rand.randint( 0, 100 ),
+                          "commits_count": rand.randint( 1, 2000 ),
+                          "lines_of_code": rand.randint( 100, 100000 ),
+                          "head_sha": "%040x" % rand.getrandbits( 160 ) }
+        for _ in range( 20 ):
+            blob_key = ( "%040x" % rand.getrandbits( 160 ), rand.choice( [ ".py", ".cpp", ".h", ".sh" ] ) )
+            loc_counts[ blob_key ] = ( rand.choice( languages ), rand.randint( 1, 2000 ) )
+    state_path = os.path.join( work_dir, "state.pickle" )
+    persist.store_object_simple( { "repos": repos, "loc": loc_counts }, state_path )
+    return state_path
+
+
+## return dict: { codec, size, compressed, ratio, compress_mbs, decompress_mbs }
+def benchmark_codec( input_file, codec, work_dir, repeat ):
+    archive_path = os.path.join( work_dir, "backup.zip" )
+    size = os.path.getsize( input_file )
+    compress_times = []
+    decompress_times = []
+    for _ in range( repeat ):
+        start_time = time.perf_counter()
+        persist.write_archive( [ input_file ], archive_path, codec )
+        compress_times.append( time.perf_counter() - start_time )
+
+        start_time = time.perf_counter()
+        with zipfile.ZipFile( archive_path, 'r' ) as zipf, zipf.open( os.path.basename( input_file ) ) as fp:
+            while fp.read( persist.CHUNK_SIZE ):
+                pass
+        decompress_times.append( time.perf_counter() - start_time )
+    compressed = os.path.getsize( archive_path )
+    os.remove( archive_path )
+    size_mb = size / 1024 / 1024
+    return { "codec": codec,
+             "size": size,
+             "compressed": compressed,
+             "ratio": size / compressed if compressed else 0.0,
+             "compress_mbs": size_mb / min( compress_times ),
+             "decompress_mbs": size_mb / min( decompress_times ) }
+
+
+def benchmark( input_files, codecs, work_dir, repeat=3 ):
+    results = []
+    for input_file in input_files:
+        for codec in codecs:
+            result = benchmark_codec( input_file, codec, work_dir, repeat )
+            result[ "file" ] = input_file
+            results.append( result )
+    return results
+
+
+def print_results( results ):
+    print( "{:<30} {:<10} {:>12} {:>12} {:>7} {:>12} {:>12}".format( "file", "codec", "size", "compressed", "ratio",
+                                                                      "comp [MB/s]", "decomp [MB/s]" ) )
+    for item in results:
+        print( "{:<30} {:<10} {:>12} {:>12} {:>7.2f} {:>12.1f} {:>12.1f}".format( os.path.basename( item[ "file" ] )[-30:],
+                                                                                  item[ "codec" ],
+                                                                                  item[ "size" ],
+                                                                                  item[ "compressed" ],
+                                                                                  item[ "ratio" ],
+                                                                                  item[ "compress_mbs" ],
+                                                                                  item[ "decompress_mbs" ] ) )
+
+
+def main():
+    parser = argparse.ArgumentParser( description='compare compression codecs of persist backups' )
+    parser.add_argument( 'files', nargs='*',
+                         help="files to compress (default: state files in 'tmp/cache', generated sample if none exist)" )
+    parser.add_argument( '--codecs', default=",".join( DEFAULT_CODECS ),
+                         help="comma separated list of codecs (default: %(default)s)" )
+    parser.add_argument( '--repeat', type=int, default=3, help="number of repetitions, best time is taken (default: 3)" )
+    parser.add_argument( '--json', action='store_true', help="print results as JSON" )
+    args = parser.parse_args()
+
+    logging.basicConfig( level=logging.WARNING, stream=sys.stdout )
+    codecs = [ codec.strip() for codec in args.codecs.split( "," ) if codec.strip() ]
+    for codec in codecs:
+        persist.parse_codec( codec )
+
+    with tempfile.TemporaryDirectory( prefix="bench_persist_" ) as work_dir:
+        input_files = args.files
+        if not input_files:
+            input_files = find_state_files( CACHE_DIR )
+        if not input_files:
+            input_files = [ generate_state_file( work_dir ) ]
+        results = benchmark( input_files, codecs, work_dir, args.repeat )
+
+    if args.json:
+        print( json.dumps( results, indent=4 ) )
+    else:
+        print_results( results )
+
+
+if __name__ == '__main__':
+    main()
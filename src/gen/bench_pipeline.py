@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+
+import sys, os
+import logging
+import argparse
+import contextlib
+import functools
+import hashlib
+import io
+import json
+import subprocess
+import tempfile
+import threading
+import time
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import scraper
+import scrapestate
+
+
+_LOGGER = logging.getLogger(__name__)
+
+
+## size class -> (number of files, lines per file)
+REPO_SIZES = { "small":  ( 5, 40 ),
+               "medium": ( 40, 120 ),
+               "large":  ( 200, 300 ) }
+
+
+# ====================================================================
+
+
+class FakeGitHubHandler( BaseHTTPRequestHandler ):
+    """Imitates GitHub endpoints used by scraper: repos listing, contributors and stats."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):        # pylint: disable=W0622
+        pass
+
+    def do_GET(self):
+        self.server.count_request()
+        parsed = urlparse( self.path )
+        path = parsed.path
+        account = self.server.account
+        if path == "/users/{}/repos".format( scrapestate.GITHUB_USER ):
+            query = parse_qs( parsed.query )
+            per_page = int( query.get( "per_page", [ "30" ] )[0] )
+            page     = int( query.get( "page", [ "1" ] )[0] )
+            items = account[ ( page - 1 ) * per_page : page * per_page ]
+            headers = {}
+            if page * per_page < len( account ):
+                next_url = "{}/users/{}/repos?per_page={}&page={}".format( self.server.base_url, scrapestate.GITHUB_USER,
+                                                                           per_page, page + 1 )
+                headers[ "Link" ] = '<{}>; rel="next"'.format( next_url )
+            self.send_json( items, headers )
+            return
+        if path.endswith( "/stats/contributors" ):
+            self.send_json( [ { "author": { "login": scrapestate.GITHUB_USER }, "total": 10, "weeks": [] } ] )
+            return
+        if path.endswith( "/contributors" ):
+            self.send_json( [ { "login": scrapestate.GITHUB_USER, "contributions": 10 } ] )
+            return
+        self.send_json( { "message": "Not Found" }, status=404 )
+
+    def send_json(self, data, headers=None, status=200):
+        body = json.dumps( data ).encode()
+        etag = '"' + hashlib.sha1( body ).hexdigest() + '"'
+        if status == 200 and self.headers.get( "If-None-Match" ) == etag:
+            status = 304
+            body = b""
+        self.send_response( status )
+        self.send_header( "Content-Type", "application/json" )
+        self.send_header( "Content-Length", str( len( body ) ) )
+        self.send_header( "ETag", etag )
+        for key, value in ( headers or {} ).items():
+            self.send_header( key, value )
+        self.end_headers()
+        self.wfile.write( body )
+
+
+class FakeGitHubServer( ThreadingHTTPServer ):
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__( ( "127.0.0.1", 0 ), FakeGitHubHandler )
+        self.base_url = "http://127.0.0.1:{}".format( self.server_address[1] )
+        self.account = []
+        self.requests_num = 0
+        self._lock = threading.Lock()
+
+    def count_request(self):
+        with self._lock:
+            self.requests_num += 1
+
+    def start(self):
+        thread = threading.Thread( target=self.serve_forever, daemon=True )
+        thread.start()
+
+
+# ====================================================================
+
+
+def run_git( args, cwd ):
+    subprocess.run( [ "git" ] + args, cwd=cwd, check=True,
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL )
+
+
+## create repository with files of given size class
+def generate_git_repo( repo_dir, size_class, seed ):
+    files_num, lines_num = REPO_SIZES[ size_class ]
+    os.makedirs( repo_dir, exist_ok=True )
+    run_git( [ "init", "--quiet" ], repo_dir )
+    for index in range( files_num ):
+        sub_dir = os.path.join( repo_dir, "src", "module{}".format( index % 5 ) )
+        os.makedirs( sub_dir, exist_ok=True )
+        if index % 2 == 0:
+            file_path = os.path.join( sub_dir, "file{}.py".format( index ) )
+            lines = [ "# file {} of repo {}".format( index, seed ) ]
+            lines += [ "value_{} = {}".format( line, line * seed ) for line in range( lines_num ) ]
+        else:
+            file_path = os.path.join( sub_dir, "file{}.cpp".format( index ) )
+            lines = [ "// file {} of repo {}".format( index, seed ) ]
+            lines += [ "int value_{} = {};".format( line, line * seed ) for line in range( lines_num ) ]
+        with open( file_path, 'w' ) as fp:
+            fp.write( "\n".join( lines ) + "\n" )
+    run_git( [ "add", "." ], repo_dir )
+    run_git( [ "-c", "user.name=bench", "-c", "user.email=bench@localhost",
+               "commit", "--quiet", "-m", "initial" ], repo_dir )
+
+
+## generate pool of repositories, return list of paths
+def generate_repo_pool( work_dir, pool_size ):
+    pool = []
+    size_classes = list( REPO_SIZES.keys() )
+    for index in range( pool_size ):
+        size_class = size_classes[ index % len( size_classes ) ]
+        repo_dir = os.path.join( work_dir, "pool", "{}_{}".format( size_class, index ) )
+        generate_git_repo( repo_dir, size_class, index + 1 )
+        pool.append( repo_dir )
+    return pool
+
+
+## create listing of account, each repository has own URL (symlink to repository from pool)
+def generate_account( server, work_dir, repos_num, pool ):
+    links_dir = os.path.join( work_dir, "links_{}".format( repos_num ) )
+    os.makedirs( links_dir, exist_ok=True )
+    account = []
+    for index in range( repos_num ):
+        name = "repo{:04d}".format( index )
+        link_path = os.path.join( links_dir, name )
+        if not os.path.exists( link_path ):
+            os.symlink( pool[ index % len( pool ) ], link_path )
+        api_url = "{}/repos/{}/{}".format( server.base_url, scrapestate.GITHUB_USER, name )
+        created = "2020-01-01T00:00:00Z"
+        account.append( { "name": name,
+                          "full_name": scrapestate.GITHUB_USER + "/" + name,
+                          "description": "repository " + name,
+                          "language": "Python",
+                          "fork": index % 10 == 9,
+                          "stargazers_count": index % 7,
+                          "created_at": created,
+                          "updated_at": created,
+                          "pushed_at": created,
+                          "url": api_url,
+                          "contributors_url": api_url + "/contributors",
+                          "clone_url": "file://" + link_path } )
+    return account
+
+
+# ====================================================================
+
+
+class StageTimer():
+    """Accumulates time spent in pipeline stages (summed over all concurrent tasks)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = {}
+
+    def add(self, stage, duration):
+        with self._lock:
+            data = self.stages.setdefault( stage, { "calls": 0, "time": 0.0 } )
+            data[ "calls" ] += 1
+            data[ "time" ]  += duration
+
+    def wrap(self, stage, func):
+        @functools.wraps( func )
+        def wrapper( *args, **kwargs ):
+            start_time = time.perf_counter()
+            try:
+                return func( *args, **kwargs )
+            finally:
+                self.add( stage, time.perf_counter() - start_time )
+        return wrapper
+
+    def wrap_async(self, stage, func):
+        @functools.wraps( func )
+        async def wrapper( *args, **kwargs ):
+            start_time = time.perf_counter()
+            try:
+                return await func( *args, **kwargs )
+            finally:
+                self.add( stage, time.perf_counter() - start_time )
+        return wrapper
+
+    def wrap_async_generator(self, stage, func):
+        @functools.wraps( func )
+        async def wrapper( *args, **kwargs ):
+            iterator = func( *args, **kwargs )
+            while True:
+                start_time = time.perf_counter()
+                try:
+                    item = await iterator.__anext__()
+                except StopAsyncIteration:
+                    self.add( stage, time.perf_counter() - start_time )
+                    return
+                self.add( stage, time.perf_counter() - start_time )
+                yield item
+        return wrapper
+
+    def result(self):
+        return { stage: { "calls": data[ "calls" ], "time": round( data[ "time" ], 4 ) }
+                 for stage, data in sorted( self.stages.items() ) }
+
+
+## install timing wrappers on pipeline stages, return function restoring original state
+def instrument( timer ):
+    originals = []
+
+    def patch( owner, name, wrapper_func ):
+        original = getattr( owner, name )
+        originals.append( ( owner, name, original ) )
+        setattr( owner, name, wrapper_func( original ) )
+
+    patch( scraper, "iterate_repositories", functools.partial( timer.wrap_async_generator, "listing" ) )
+    patch( scraper, "is_cache_valid", functools.partial( timer.wrap, "cache_check" ) )
+    patch( scraper, "is_code_unchanged", functools.partial( timer.wrap_async, "cache_check" ) )
+    patch( scrapestate.get_repo_cache(), "get", functools.partial( timer.wrap, "cache_check" ) )
+    patch( scrapestate.get_mirror_cache(), "update", functools.partial( timer.wrap_async, "clone" ) )
+    patch( scrapestate.get_mirror_cache(), "remote_head", functools.partial( timer.wrap_async, "clone" ) )
+    patch( scrapestate.get_loc_cache(), "count_tree", functools.partial( timer.wrap_async, "loc" ) )
+    patch( scraper, "write_final_csv", functools.partial( timer.wrap, "csv_write" ) )
+
+    def restore():
+        for owner, name, original in reversed( originals ):
+            if isinstance( owner, type( scraper ) ):
+                setattr( owner, name, original )
+            else:
+                ## instance attribute shadows class method
+                delattr( owner, name )
+    return restore
+
+
+def run_pipeline( server, repos_num, run_name, jobs ):
+    timer = StageTimer()
+    restore = instrument( timer )
+    requests_before = server.requests_num
+    start_time = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout( io.StringIO() ):
+            scraper.read_repositories( stats_timeout=10.0, http_limit=jobs, subprocess_limit=jobs )
+    finally:
+        restore()
+    wall_time = time.perf_counter() - start_time
+    requests_num = server.requests_num - requests_before
+    return { "account_size": repos_num,
+             "run": run_name,
+             "jobs": jobs,
+             "wall_time": round( wall_time, 4 ),
+             "requests": requests_num,
+             "requests_per_sec": round( requests_num / wall_time, 2 ) if wall_time > 0 else 0.0,
+             "stages": timer.result() }
+
+
+def benchmark( sizes, jobs, pool_size, loc_engine, work_dir ):
+    server = FakeGitHubServer()
+    server.start()
+    scrapestate.REPOS_URL = "{}/users/{}/repos?per_page={}&sort=created&direction=asc".format( server.base_url,
+                                                                                            scrapestate.GITHUB_USER,
+                                                                                            scrapestate.REPOS_PAGE_SIZE )
+    scrapestate.LOC_ENGINE = loc_engine
+
+    _LOGGER.info( "generating %s repositories in %s", pool_size, work_dir )
+    pool = generate_repo_pool( work_dir, pool_size )
+
+    results = []
+    try:
+        for repos_num in sizes:
+            server.account = generate_account( server, work_dir, repos_num, pool )
+            ## each account size starts with empty cache
+            scrapestate.set_tmp_dir( os.path.join( work_dir, "tmp_{}".format( repos_num ) ) )
+            for run_name in ( "cold", "warm" ):
+                result = run_pipeline( server, repos_num, run_name, jobs )
+                _LOGGER.info( "%s repos, %s cache: %ss, %s requests", repos_num, run_name,
+                              result[ "wall_time" ], result[ "requests" ] )
+                results.append( result )
+    finally:
+        server.shutdown()
+        server.server_close()
+    return results
+
+
+def print_results( results, baseline=None ):
+    baseline_times = {}
+    for item in baseline or []:
+        baseline_times[ ( item[ "account_size" ], item[ "run" ] ) ] = item[ "wall_time" ]
+
+    print( "{:>6} {:>5} {:>10} {:>9} {:>9} {:>9}  {}".format( "repos", "run", "wall [s]", "requests", "req/s", "vs base", "stages [s]" ) )
+    for item in results:
+        base_time = baseline_times.get( ( item[ "account_size" ], item[ "run" ] ) )
+        ratio = "-" if not base_time else "{:.2f}x".format( base_time / item[ "wall_time" ] )
+        stages = " ".join( "{}={:.3f}".format( stage, data[ "time" ] ) for stage, data in item[ "stages" ].items() )
+        print( "{:>6} {:>5} {:>10.3f} {:>9} {:>9.1f} {:>9}  {}".format( item[ "account_size" ], item[ "run" ],
+                                                                      item[ "wall_time" ], item[ "requests" ],
+                                                                      item[ "requests_per_sec" ], ratio, stages ) )
+
+
+def main():
+    parser = argparse.ArgumentParser( description='benchmark read_github pipeline on synthetic accounts' )
+    parser.add_argument( '--sizes', default="10,100,1000", help="comma separated account sizes (default: 10,100,1000)" )
+    parser.add_argument( '-j', '--jobs', type=int, default=4,
+                         help="max number of concurrent HTTP requests and subprocesses (default: 4)" )
+    parser.add_argument( '--pool-size', type=int, default=12,
+                         help="number of distinct generated git repositories (default: 12)" )
+    parser.add_argument( '--loc-engine', choices=[ 'cloc', 'builtin' ], default='builtin',
+                         help="engine counting lines of code (default: builtin)" )
+    parser.add_argument( '--work-dir', default=None, help="directory for generated data (default: temporary)" )
+    parser.add_argument( '-o', '--output', default="bench_pipeline.json", help="output JSON file" )
+    parser.add_argument( '--compare', default=None, help="JSON file of previous run to compare with" )
+    args = parser.parse_args()
+
+    logging.basicConfig( level=logging.INFO, stream=sys.stdout, format="%(asctime)s %(levelname)-8s %(message)s" )
+    for name in ( "scraper", "scrapestate", "cachestore", "deferred", "gitmirror", "loccount", "httpclient", "httpcache", "ratelimit" ):
+        logging.getLogger( name ).setLevel( logging.WARNING )
+
+    sizes = [ int( item ) for item in args.sizes.split( "," ) if item.strip() ]
+    with contextlib.ExitStack() as stack:
+        work_dir = args.work_dir
+        if work_dir is None:
+            work_dir = stack.enter_context( tempfile.TemporaryDirectory( prefix="bench_pipeline_" ) )
+        results = benchmark( sizes, args.jobs, args.pool_size, args.loc_engine, work_dir )
+
+    output = { "date": time.strftime( "%Y-%m-%d %H:%M:%S" ),
+               "jobs": args.jobs,
+               "loc_engine": args.loc_engine,
+               "results": results }
+    with open( args.output, 'w' ) as fp:
+        json.dump( output, fp, indent=4 )
+    _LOGGER.info( "results stored to: %s", args.output )
+
+    baseline = None
+    if args.compare:
+        with open( args.compare, 'r' ) as fp:
+            baseline = json.load( fp )[ "results" ]
+    print_results( results, baseline )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+import logging
+import os
+import threading
+import sqlite3
+import pickle
+import urllib.parse
+
+import persist
+
+
+_LOGGER = logging.getLogger(__name__)
+
+
+# ====================================================================
+
+
+class RepoCacheStore():
+    """Single-file (SQLite) store of cached repositories data.
+
+    All entries are loaded in one bulk read and kept in memory. Modified
+    entries are written in one transaction by 'commit()'.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self._connection = None
+        self._entries = None
+        self._pending = {}
+        self.hits   = 0
+        self.misses = 0
+
+    ## readonly -- open existing file without creating or modifying it (commands reading only caches)
+    def open(self, readonly=False):
+        with self._lock:
+            if self._connection is not None:
+                return
+            if readonly:
+                db_uri = "file:{}?mode=ro".format( urllib.parse.quote( os.path.abspath( self.db_path ) ) )
+                self._connection = sqlite3.connect( db_uri, uri=True, check_same_thread=False )
+                return
+            db_dir = os.path.dirname( self.db_path )
+            if db_dir:
+                os.makedirs( db_dir, exist_ok=True )
+            self._connection = sqlite3.connect( self.db_path, check_same_thread=False )
+            self._connection.execute( "CREATE TABLE IF NOT EXISTS repos ( name TEXT PRIMARY KEY, data BLOB NOT NULL )" )
+            self._connection.commit()
+
+    def close(self):
+        with self._lock:
+            self.commit()
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+            self._entries = None
+
+    ## read all entries in one query
+    def load_all(self):
+        with self._lock:
+            self.open()
+            entries = {}
+            for name, data in self._connection.execute( "SELECT name, data FROM repos" ):
+                try:
+                    entries[ name ] = pickle.loads( data )
+                except Exception:      # pylint: disable=W0703
+                    _LOGGER.warning( "unable to load cache entry: %s", name )
+            self._entries = entries
+            _LOGGER.info( "loaded %s entries from %s", len( entries ), self.db_path )
+            return len( entries )
+
+    def get(self, name):
+        with self._lock:
+            self._ensure_loaded()
+            data = self._entries.get( name )
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return data
+
+    def put(self, name, data):
+        with self._lock:
+            self._ensure_loaded()
+            self._entries[ name ] = data
+            self._pending[ name ] = data
+
+    def remove(self, name):
+        with self._lock:
+            self._ensure_loaded()
+            self._entries.pop( name, None )
+            self._pending.pop( name, None )
+            self._connection.execute( "DELETE FROM repos WHERE name = ?", ( name, ) )
+            self._connection.commit()
+
+    def names(self):
+        with self._lock:
+            self._ensure_loaded()
+            return sorted( self._entries.keys() )
+
+    ## write modified entries in single transaction
+    def commit(self):
+        with self._lock:
+            if not self._pending:
+                return 0
+            rows = [ ( name, pickle.dumps( data ) ) for name, data in self._pending.items() ]
+            with self._connection:
+                self._connection.executemany( "INSERT OR REPLACE INTO repos ( name, data ) VALUES ( ?, ? )", rows )
+            self._pending.clear()
+            _LOGGER.info( "stored %s entries in %s", len( rows ), self.db_path )
+            return len( rows )
+
+    ## rebuild database file to reclaim unused space
+    def compact(self):
+        with self._lock:
+            self.open()
+            self.commit()
+            self._connection.execute( "VACUUM" )
+
+    ## import entries from directory of '<name>.pickle' files, return number of imported entries
+    def migrate_pickles(self, pickle_dir):
+        if not os.path.isdir( pickle_dir ):
+            return 0
+        counter = 0
+        with self._lock:
+            self._ensure_loaded()
+            for file_name in sorted( os.listdir( pickle_dir ) ):
+                if not file_name.endswith( ".pickle" ):
+                    continue
+                data = persist.load_object_simple( os.path.join( pickle_dir, file_name ), silent=True )
+                if data is None:
+                    continue
+                name = file_name[ : -len( ".pickle" ) ]
+                self._entries[ name ] = data
+                self._pending[ name ] = data
+                counter += 1
+            self.commit()
+        _LOGGER.info( "migrated %s entries from %s", counter, pickle_dir )
+        return counter
+
+    def stats(self):
+        with self._lock:
+            requests_num = self.hits + self.misses
+            hit_rate = 0.0 if requests_num == 0 else round( self.hits / requests_num, 3 )
+            entries = 0 if self._entries is None else len( self._entries )
+        try:
+            size = os.path.getsize( self.db_path )
+        except OSError:
+            size = 0
+        return { "entries": entries, "hits": self.hits, "misses": self.misses,
+                 "hit_rate": hit_rate, "size": size }
+
+    def _ensure_loaded(self):
+        if self._entries is None:
+            self.load_all()
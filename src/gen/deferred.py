@@ -0,0 +1,85 @@
+import logging
+import asyncio
+import threading
+import time
+
+
+_LOGGER = logging.getLogger(__name__)
+
+
+# ====================================================================
+
+
+class DeferredQueue():
+    """Queue of URLs answered with '202 Accepted'.
+
+    GitHub computes statistics in background and responds with 202 until data
+    is ready. Instead of blocking on such URL, it is put into the queue and
+    polled later in batches until ready or until deadline passes. URLs of
+    single batch are requested concurrently.
+
+    'read_func' is coroutine function receiving URL and returning list:
+    [status_code, data, headers] or None.
+    """
+
+    def __init__(self, read_func, interval=2.0, batch_size=20):
+        self.read_func  = read_func
+        self.interval   = interval
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._pending = []
+
+    def __len__(self):
+        with self._lock:
+            return len( self._pending )
+
+    ## on_ready -- function called with response data when URL is ready
+    ## on_expired -- coroutine function called without arguments if URL was not ready before deadline
+    def add(self, url, on_ready, on_expired=None):
+        _LOGGER.info( "deferring request: %s", url )
+        with self._lock:
+            self._pending.append( ( url, on_ready, on_expired ) )
+
+    ## poll pending URLs until all are ready or 'timeout' seconds passed
+    async def poll(self, timeout=60.0):
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            pending = self._pending
+            self._pending = []
+        _LOGGER.info( "polling %s deferred requests", len( pending ) )
+
+        while pending:
+            still_pending = []
+            for index in range( 0, len( pending ), self.batch_size ):
+                batch = pending[ index : index + self.batch_size ]
+                if time.monotonic() >= deadline:
+                    ## items not polled in this round stay pending
+                    still_pending.extend( pending[ index: ] )
+                    break
+                finished_list = await asyncio.gather( *( self._poll_item( item ) for item in batch ) )
+                still_pending.extend( item for item, finished in zip( batch, finished_list ) if finished is False )
+            pending = still_pending
+            if not pending:
+                break
+            time_left = deadline - time.monotonic()
+            if time_left <= 0:
+                break
+            await asyncio.sleep( min( self.interval, time_left ) )
+
+        for url, _, on_expired in pending:
+            _LOGGER.warning( "deferred request not ready before deadline: %s", url )
+            if on_expired is not None:
+                await on_expired()
+
+    ## return True if item is finished (ready or failed)
+    async def _poll_item(self, item):
+        url, on_ready, on_expired = item
+        response = await self.read_func( url )
+        if response is None:
+            if on_expired is not None:
+                await on_expired()
+            return True
+        if response[0] == 202:
+            return False
+        on_ready( response[1] )
+        return True
@@ -0,0 +1,109 @@
+import logging
+
+
+_LOGGER = logging.getLogger(__name__)
+
+
+GRAPHQL_URL = "https://api.github.com/graphql"
+
+
+USER_ID_QUERY = """
+query( $login: String! ) {
+    user( login: $login ) {
+        id
+    }
+}
+"""
+
+## commits are counted on default branch for given author
+REPOS_QUERY = """
+query( $login: String!, $authorId: ID!, $pageSize: Int!, $cursor: String ) {
+    user( login: $login ) {
+        repositories( first: $pageSize, after: $cursor, ownerAffiliations: OWNER,
+                      orderBy: { field: CREATED_AT, direction: ASC } ) {
+            pageInfo {
+                hasNextPage
+                endCursor
+            }
+            nodes {
+                name
+                description
+                isFork
+                stargazerCount
+                createdAt
+                updatedAt
+                pushedAt
+                url
+                diskUsage
+                primaryLanguage {
+                    name
+                }
+                defaultBranchRef {
+                    target {
+                        ... on Commit {
+                            oid
+                            history( author: { id: $authorId } ) {
+                                totalCount
+                            }
+                        }
+                    }
+                }
+            }
+        }
+    }
+}
+"""
+
+
+# ====================================================================
+
+
+class GraphQLError( Exception ):
+    pass
+
+
+## yield repositories of given user
+## read_func -- coroutine function sending query, receives (query, variables) and returns 'data' field of response
+## each item has the same fields as item of REST listing used by scraper ('name', 'language', 'fork',
+## 'stargazers_count', 'description', dates, 'clone_url', 'size') and additionally 'head_sha' and 'commits_count'
+async def iterate_repositories( read_func, login, page_size=100 ):
+    user_data = await read_func( USER_ID_QUERY, { "login": login } )
+    author_id = user_data[ "user" ][ "id" ]
+
+    cursor = None
+    while True:
+        variables = { "login": login, "authorId": author_id, "pageSize": page_size, "cursor": cursor }
+        page_data = await read_func( REPOS_QUERY, variables )
+        repositories = page_data[ "user" ][ "repositories" ]
+        for node in repositories[ "nodes" ]:
+            yield convert_node( node )
+        page_info = repositories[ "pageInfo" ]
+        if page_info[ "hasNextPage" ] is False:
+            break
+        cursor = page_info[ "endCursor" ]
+
+
+## convert GraphQL repository node to REST-like dict
+def convert_node( node ):
+    language = node.get( "primaryLanguage" ) or {}
+    head_sha = None
+    commits_count = ""
+    branch_ref = node.get( "defaultBranchRef" ) or {}
+    target = branch_ref.get( "target" ) or {}
+    if target:
+        head_sha = target.get( "oid" )
+        history = target.get( "history" ) or {}
+        commits_count = history.get( "totalCount", "" )
+    return { "name": node[ "name" ],
+             "language": language.get( "name" ),
+             "fork": node[ "isFork" ],
+             "stargazers_count": node[ "stargazerCount" ],
+             "description": node[ "description" ],
+             "created_at": node[ "createdAt" ],
+             "updated_at": node[ "updatedAt" ],
+             "pushed_at": node[ "pushedAt" ],
+             "clone_url": node[ "url" ] + ".git",
+             "size": node.get( "diskUsage" ),
+             "head_sha": head_sha,
+             "commits_count": commits_count
+            }
@@ -0,0 +1,174 @@
+import logging
+import os
+import asyncio
+import shutil
+import subprocess
+import urllib.parse
+
+
+_LOGGER = logging.getLogger(__name__)
+
+
+## reference keeping fetched HEAD of remote repository
+MIRROR_REF = "refs/mirror/head"
+
+
+# ====================================================================
+
+
+class MirrorCache():
+    """Directory of bare repositories mirroring remote HEADs.
+
+    Each remote repository has its own bare repository updated with shallow,
+    incremental 'git fetch', so only objects changed since last fetch are
+    downloaded. Git is run as asyncio subprocess, so methods running it are
+    coroutines.
+    """
+
+    def __init__(self, mirror_dir):
+        self.mirror_dir = mirror_dir
+
+    ## return path to bare repository for given clone URL
+    def mirror_path(self, repoUrl):
+        return os.path.join( self.mirror_dir, mirror_name( repoUrl ) )
+
+    ## fetch remote HEAD into mirror, return path to mirror or None on failure
+    async def update(self, repoUrl):
+        repoPath = self.mirror_path( repoUrl )
+        if not os.path.isdir( repoPath ):
+            os.makedirs( self.mirror_dir, exist_ok=True )
+            returncode, _ = await run_git( [ "init", "--bare", "--quiet", repoPath ] )
+            if returncode != 0:
+                _LOGGER.warning( "unable to create mirror: %s", repoPath )
+                return None
+        _LOGGER.info( "fetching %s into %s", repoUrl, repoPath )
+        returncode, _ = await run_git( fetch_args( repoUrl ), git_dir=repoPath )
+        if returncode != 0:
+            _LOGGER.warning( "unable to fetch repository: %s", repoUrl )
+            return None
+        return repoPath
+
+    ## return SHA of fetched HEAD or None
+    async def head_sha(self, repoPath):
+        returncode, output = await run_git( [ "rev-parse", "--verify", "--quiet", MIRROR_REF ], git_dir=repoPath,
+                                            capture=True )
+        if returncode != 0:
+            return None
+        return output.decode().strip()
+
+    ## return SHA of HEAD of remote repository (without fetching) or None
+    async def remote_head(self, repoUrl):
+        returncode, output = await run_git( [ "ls-remote", repoUrl, "HEAD" ], capture=True )
+        if returncode != 0:
+            _LOGGER.warning( "unable to read remote HEAD: %s", repoUrl )
+            return None
+        return parse_remote_head( output )
+
+    ## return list of tuples (blob_sha, path) of regular files in fetched HEAD tree
+    async def list_tree(self, repoPath):
+        returncode, output = await run_git( [ "ls-tree", "-r", "-z", MIRROR_REF ], git_dir=repoPath, capture=True )
+        if returncode != 0:
+            return None
+        return parse_tree( output )
+
+    ## return list of pairs (blob_sha, content) for given blobs
+    async def read_blobs(self, repoPath, shaList):
+        command = [ "git", "--git-dir", repoPath, "cat-file", "--batch" ]
+        proc = await asyncio.create_subprocess_exec( *command, stdin=subprocess.PIPE, stdout=subprocess.PIPE )
+
+        async def write_requests():
+            ## requests are written concurrently with reading, so pipes never fill up
+            for sha in shaList:
+                proc.stdin.write( sha.encode() + b"\n" )
+                await proc.stdin.drain()
+            proc.stdin.close()
+
+        writer = asyncio.create_task( write_requests() )
+        blobs = []
+        try:
+            for sha in shaList:
+                header = ( await proc.stdout.readline() ).split()
+                if len( header ) < 3 or header[1] != b"blob":
+                    continue
+                size = int( header[2] )
+                content = await proc.stdout.readexactly( size )
+                await proc.stdout.readexactly( 1 )          ## trailing new line
+                blobs.append( ( sha, content ) )
+            await writer
+            await proc.wait()
+        except BaseException:
+            ## process is killed only on failure or cancellation, finished process exits by itself
+            writer.cancel()
+            if proc.returncode is None:
+                proc.kill()
+            await proc.wait()
+            raise
+        return blobs
+
+    ## list names of mirrors
+    def list_mirrors(self):
+        if not os.path.isdir( self.mirror_dir ):
+            return []
+        return sorted( item for item in os.listdir( self.mirror_dir ) if item.endswith( ".git" ) )
+
+    ## remove mirrors of repositories not present in 'repoUrls', return list of removed names
+    def prune(self, repoUrls):
+        keep = set( mirror_name( url ) for url in repoUrls )
+        removed = []
+        for name in self.list_mirrors():
+            if name in keep:
+                continue
+            _LOGGER.info( "removing mirror: %s", name )
+            shutil.rmtree( os.path.join( self.mirror_dir, name ) )
+            removed.append( name )
+        return removed
+
+
+## convert clone URL to mirror directory name, e.g. 'owner__repo.git'
+def mirror_name( repoUrl ):
+    path = urllib.parse.urlparse( repoUrl ).path
+    path = path.rstrip( "/" )
+    if path.endswith( ".git" ):
+        path = path[:-4]
+    parts = [ item for item in path.split( "/" ) if item ]
+    return "__".join( parts[-2:] ) + ".git"
+
+
+def fetch_args( repoUrl ):
+    return [ "fetch", "--quiet", "--depth", "1", "--no-tags", repoUrl, "+HEAD:" + MIRROR_REF ]
+
+
+## return SHA from output of 'git ls-remote' or None
+def parse_remote_head( output ):
+    output = output.decode().split()
+    if not output:
+        return None
+    return output[0]
+
+
+## return list of tuples (blob_sha, path) from output of 'git ls-tree -r -z'
+def parse_tree( output ):
+    files_list = []
+    for entry in output.split( b"\0" ):
+        if not entry:
+            continue
+        info, _, path = entry.partition( b"\t" )
+        mode, obj_type, sha = info.split()
+        if obj_type != b"blob" or mode == b"120000":
+            ## skip submodules and symlinks
+            continue
+        files_list.append( ( sha.decode(), path.decode( errors="surrogateescape" ) ) )
+    return files_list
+
+
+## run git as asyncio subprocess, return tuple: (return code, stdout or None)
+## capture -- if True, standard output is captured
+async def run_git( args, git_dir=None, capture=False ):
+    command = [ "git" ]
+    if git_dir is not None:
+        command += [ "--git-dir", git_dir ]
+    command += args
+    stdout = subprocess.PIPE if capture else None
+    proc = await asyncio.create_subprocess_exec( *command, stdout=stdout )
+    output, _ = await proc.communicate()
+    return ( proc.returncode, output )
@@ -0,0 +1,151 @@
+import logging
+import os
+import threading
+import hashlib
+
+import persist
+
+
+_LOGGER = logging.getLogger(__name__)
+
+
+# ====================================================================
+
+
+class ResponseCache():
+    """On-disk cache of HTTP responses used for conditional requests.
+
+    Each URL is stored in separate file containing body and validators ('ETag'
+    and 'Last-Modified'). When total size of cache exceeds 'max_size' least
+    recently used entries are removed.
+    """
+
+    def __init__(self, cache_dir, max_size=64 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_size  = max_size
+        self.enabled   = True
+        self._lock = threading.Lock()
+        self._total_size = None         ## calculated on first store
+        self.hits   = 0
+        self.misses = 0
+
+    def get(self, url):
+        if self.enabled is False:
+            return None
+        entry_path = self._entry_path( url )
+        try:
+            entry = persist.load_object_simple( entry_path, silent=True )
+        except Exception:      # pylint: disable=W0703
+            ## damaged entry (e.g. written by interrupted run) -- treated as miss and replaced by next store
+            _LOGGER.warning( "unable to load http cache entry: %s", entry_path )
+            return None
+        if not isinstance( entry, dict ) or entry.get( "url" ) != url:
+            return None
+        return entry
+
+    ## return headers to send with request to validate cached entry
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry is None:
+            return headers
+        etag = entry.get( "etag" )
+        if etag:
+            headers[ "If-None-Match" ] = etag
+        last_modified = entry.get( "last_modified" )
+        if last_modified:
+            headers[ "If-Modified-Since" ] = last_modified
+        return headers
+
+    ## 'response' is list: [status_code, content, headers]
+    def store(self, url, response):
+        if self.enabled is False:
+            return
+        resp_headers = response[2]
+        etag          = resp_headers.get( "ETag" )
+        last_modified = resp_headers.get( "Last-Modified" )
+        if not etag and not last_modified:
+            ## response can't be validated -- nothing to gain from storing it
+            return
+        entry = { "url": url,
+                  "content": response[1],
+                  "headers": list( resp_headers.items() ),
+                  "etag": etag,
+                  "last_modified": last_modified }
+        entry_path = self._entry_path( url )
+        with self._lock:
+            prev_size = self._file_size( entry_path )
+            persist.store_object_simple( entry, entry_path )
+            if self._total_size is not None:
+                self._total_size += self._file_size( entry_path ) - prev_size
+            self._evict()
+
+    ## mark entry as recently used and return response recreated from entry
+    def use(self, url, entry):
+        with self._lock:
+            self.hits += 1
+        entry_path = self._entry_path( url )
+        try:
+            os.utime( entry_path )
+        except OSError:
+            pass
+        import httpclient                   # pylint: disable=C0415
+        headers = httpclient.make_headers( entry["headers"] )
+        return [ 200, entry["content"], headers ]
+
+    def count_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def size(self):
+        with self._lock:
+            return self._calculate_size()
+
+    def clear(self):
+        with self._lock:
+            for path, _, _ in self._list_entries():
+                os.remove( path )
+            self._total_size = 0
+
+    def stats(self):
+        return { "hits": self.hits, "misses": self.misses, "size": self.size() }
+
+    def _entry_path(self, url):
+        url_hash = hashlib.sha1( url.encode() ).hexdigest()
+        return os.path.join( self.cache_dir, url_hash + ".pickle" )
+
+    def _calculate_size(self):
+        if self._total_size is None:
+            self._total_size = sum( item[2] for item in self._list_entries() )
+        return self._total_size
+
+    ## remove least recently used entries until cache fits in 'max_size'
+    def _evict(self):
+        if self._calculate_size() <= self.max_size:
+            return
+        entries = self._list_entries()
+        entries.sort( key=lambda item: item[1] )
+        for path, _, size in entries:
+            if self._total_size <= self.max_size:
+                break
+            _LOGGER.debug( "evicting http cache entry: %s", path )
+            os.remove( path )
+            self._total_size -= size
+
+    ## return list of tuples: (path, mtime, size)
+    def _list_entries(self):
+        if not os.path.isdir( self.cache_dir ):
+            return []
+        ret_list = []
+        with os.scandir( self.cache_dir ) as it:
+            for dir_entry in it:
+                if not dir_entry.name.endswith( ".pickle" ):
+                    continue
+                stat = dir_entry.stat()
+                ret_list.append( ( dir_entry.path, stat.st_mtime, stat.st_size ) )
+        return ret_list
+
+    def _file_size(self, path):
+        try:
+            return os.path.getsize( path )
+        except OSError:
+            return 0
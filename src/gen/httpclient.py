@@ -0,0 +1,278 @@
+import logging
+import threading
+import http.client
+from io import BytesIO
+
+## backend libraries ('requests', 'pycurl') are imported when client is created,
+## so only the selected one has to be installed
+
+
+_LOGGER = logging.getLogger(__name__)
+
+
+# ====================================================================
+
+
+class HttpClient():
+    """Long-lived HTTP client reusing connections between requests.
+
+    'get()' returns list: [status_code, content, headers]
+    """
+
+    def __init__(self):
+        self._stats_lock = threading.Lock()
+        self.requests_num = 0
+
+    def get(self, url, headers=None):
+        raise NotImplementedError('You need to define this method in derived class!')
+
+    ## send POST request with 'data' (bytes) as body
+    def post(self, url, data, headers=None):
+        raise NotImplementedError('You need to define this method in derived class!')
+
+    def close(self):
+        pass
+
+    ## return dict with number of requests and new/reused connections
+    def stats(self):
+        raise NotImplementedError('You need to define this method in derived class!')
+
+    def _count_request(self):
+        with self._stats_lock:
+            self.requests_num += 1
+
+
+# ====================================================================
+
+
+class RequestsClient( HttpClient ):
+
+    def __init__(self, pool_size=16):
+        # pylint: disable=C0415
+        import requests
+        import requests_file
+
+        super().__init__()
+        self.http_requests_num = 0
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter( pool_connections=pool_size, pool_maxsize=pool_size )
+        self.session.mount( 'https://', adapter )
+        self.session.mount( 'http://', adapter )
+        self.session.mount( 'file://', requests_file.FileAdapter() )
+
+    def get(self, url, headers=None):
+        self._count_request()
+        if not url.startswith( "file://" ):
+            with self._stats_lock:
+                self.http_requests_num += 1
+        response = self.session.get( url, headers=headers, timeout=20 )
+        return [ response.status_code, response.text, response.headers ]
+
+    def post(self, url, data, headers=None):
+        self._count_request()
+        with self._stats_lock:
+            self.http_requests_num += 1
+        response = self.session.post( url, data=data, headers=headers, timeout=60 )
+        return [ response.status_code, response.text, response.headers ]
+
+    def close(self):
+        self.session.close()
+
+    def stats(self):
+        ## each urllib3 pool counts connections it had to open
+        new_connections = 0
+        for adapter in set( self.session.adapters.values() ):
+            poolmanager = getattr( adapter, "poolmanager", None )
+            if poolmanager is None:
+                continue
+            for key in list( poolmanager.pools.keys() ):
+                pool = poolmanager.pools.get( key )
+                if pool is not None:
+                    new_connections += pool.num_connections
+        reused = max( 0, self.http_requests_num - new_connections )
+        return { "requests": self.requests_num, "new_connections": new_connections, "reused_connections": reused }
+
+
+# ====================================================================
+
+
+class PycurlClient( HttpClient ):
+    """Client keeping one curl handle per thread.
+
+    Reusing handle allows libcurl to keep connections alive between transfers.
+    """
+
+    def __init__(self):
+        # pylint: disable=C0415
+        import pycurl
+
+        super().__init__()
+        self.pycurl = pycurl
+        self.new_connections = 0
+        self.reused_connections = 0
+        self._local = threading.local()
+        self._handles = []
+
+    def _get_handle(self):
+        curl = getattr( self._local, "curl", None )
+        if curl is None:
+            curl = self.pycurl.Curl()
+            self._local.curl = curl
+            with self._stats_lock:
+                self._handles.append( curl )
+        return curl
+
+    def get(self, url, headers=None):
+        return self._perform( url, headers )
+
+    def post(self, url, data, headers=None):
+        return self._perform( url, headers, data )
+
+    def _perform(self, url, headers=None, post_data=None):
+        pycurl = self.pycurl
+        self._count_request()
+        curl = self._get_handle()
+        curl.reset()
+
+        # curl.setopt(pycurl.VERBOSE, 1)
+        # curl.setopt( pycurl.HTTP_VERSION, pycurl.CURL_HTTP_VERSION_1_0 )        ## disable data chunks (causes pycurl to hang)
+
+        # Set URL value
+        curl.setopt( pycurl.URL, url )
+        curl.setopt( pycurl.FOLLOWLOCATION, 1 )
+        curl.setopt( pycurl.TIMEOUT, 30 )
+
+        curl.setopt( pycurl.USERAGENT,
+                    "Mozilla/5.0 (compatible, MSIE 11, Windows NT 6.3; Trident/7.0; rv:11.0) like Gecko" )
+
+        request_headers = {
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
+#             "Accept-Encoding": "br",                          ## causes curl to receive bytes instead of string
+            "Accept-Language": "en-US,en;q=0.5",
+        }
+        if headers:
+            request_headers.update( headers )
+
+        headersList = []
+        for key, value in request_headers.items():
+            headersList.append( f"{key}: {value}" )
+        curl.setopt( pycurl.HTTPHEADER, headersList )
+
+        if post_data is not None:
+            curl.setopt( pycurl.POSTFIELDS, post_data )
+
+        header_obj = BytesIO()
+        data_obj   = BytesIO()
+
+        curl.setopt( pycurl.HEADERFUNCTION, header_obj.write )
+        curl.setopt( pycurl.WRITEDATA, data_obj )
+
+        _LOGGER.debug( "performing curl request for %s", url )
+
+        # Perform a file transfer
+        curl.perform()
+
+        resp_code = curl.getinfo( pycurl.RESPONSE_CODE )
+
+        ## number of new connections made to complete transfer, 0 if reused
+        connects = curl.getinfo( pycurl.NUM_CONNECTS )
+        with self._stats_lock:
+            if connects > 0:
+                self.new_connections += connects
+            elif not url.startswith( "file://" ):
+                self.reused_connections += 1
+
+        _LOGGER.debug( "converting curl response from %s", url )
+
+        response_header = parse_raw_headers( header_obj.getvalue() )
+        response_body   = data_obj.getvalue()
+
+        try:
+            ## try convert to string
+            converted_data = response_body.decode('utf8')
+        except UnicodeDecodeError:
+            ## it seems that received binary data (e.g. xls or zip)
+            converted_data = response_body
+
+        return [ resp_code, converted_data, response_header ]
+
+    def close(self):
+        with self._stats_lock:
+            for curl in self._handles:
+                curl.close()
+            self._handles.clear()
+        self._local = threading.local()
+
+    def stats(self):
+        return { "requests": self.requests_num,
+                 "new_connections": self.new_connections,
+                 "reused_connections": self.reused_connections }
+
+
+## convert raw headers received by curl to case-insensitive mapping
+## in case of redirections only headers of last response are taken
+def parse_raw_headers( raw_headers ):
+    blocks = raw_headers.replace( b"\r\n", b"\n" ).split( b"\n\n" )
+    blocks = [ block for block in blocks if block.strip() ]
+    if not blocks:
+        return http.client.HTTPMessage()
+    last_block = blocks[-1]
+    ## skip status line
+    _, _, fields = last_block.partition( b"\n" )
+    return http.client.parse_headers( BytesIO( fields + b"\n\n" ) )
+
+
+## create case-insensitive headers mapping from list of (name, value) pairs
+def make_headers( items ):
+    headers = http.client.HTTPMessage()
+    for key, value in items:
+        headers[ key ] = value
+    return headers
+
+
+# ====================================================================
+
+
+def create_async_client():
+    # pylint: disable=C0415
+    import asynchttp
+    return asynchttp.AsyncioClient()
+
+
+## backend name -> function creating client
+BACKENDS = { "requests": RequestsClient,
+             "pycurl": PycurlClient,
+             "async": create_async_client }
+
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+## return shared client for given backend
+def get_client( backend="requests" ):
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get( backend )
+        if client is None:
+            create_client = BACKENDS[ backend ]
+            client = create_client()
+            _CLIENTS[ backend ] = client
+        return client
+
+
+## replace shared client of given backend (e.g. by recording or replaying client)
+def install_client( backend, client ):
+    with _CLIENTS_LOCK:
+        _CLIENTS[ backend ] = client
+
+
+def close_clients():
+    with _CLIENTS_LOCK:
+        for client in _CLIENTS.values():
+            client.close()
+        _CLIENTS.clear()
+
+
+def log_stats():
+    with _CLIENTS_LOCK:
+        for backend, client in _CLIENTS.items():
+            _LOGGER.info( "http client '%s' stats: %s", backend, client.stats() )
@@ -0,0 +1,325 @@
+import logging
+import os
+import hashlib
+import threading
+import atexit
+import multiprocessing
+import concurrent.futures
+
+
+_LOGGER = logging.getLogger(__name__)
+
+
+# ====================================================================
+
+
+class Language():
+    """Comment syntax of language.
+
+    line_comments -- markers starting comment till end of line
+    block_comments -- list of pairs (start marker, end marker)
+    """
+
+    def __init__(self, name, line_comments=None, block_comments=None):
+        self.name = name
+        self.line_comments  = line_comments or []
+        self.block_comments = block_comments or []
+
+
+C_STYLE  = dict( line_comments=[ "//" ], block_comments=[ ( "/*", "*/" ) ] )
+SH_STYLE = dict( line_comments=[ "#" ] )
+
+
+## names follow cloc, so results can be compared by language
+LANGUAGES = {
+    "C":                Language( "C", **C_STYLE ),
+    "C++":              Language( "C++", **C_STYLE ),
+    "C/C++ Header":     Language( "C/C++ Header", **C_STYLE ),
+    "Java":             Language( "Java", **C_STYLE ),
+    "JavaScript":       Language( "JavaScript", **C_STYLE ),
+    "TypeScript":       Language( "TypeScript", **C_STYLE ),
+    "Rust":             Language( "Rust", **C_STYLE ),
+    "Go":               Language( "Go", **C_STYLE ),
+    "C#":               Language( "C#", **C_STYLE ),
+    "CSS":              Language( "CSS", block_comments=[ ( "/*", "*/" ) ] ),
+    "SCSS":             Language( "SCSS", **C_STYLE ),
+    ## cloc treats docstrings as comments
+    "Python":           Language( "Python", line_comments=[ "#" ],
+                                  block_comments=[ ( '"""', '"""' ), ( "'''", "'''" ) ] ),
+    "Bourne Shell":     Language( "Bourne Shell", **SH_STYLE ),
+    "Bourne Again Shell": Language( "Bourne Again Shell", **SH_STYLE ),
+    "CMake":            Language( "CMake", line_comments=[ "#" ], block_comments=[ ( "#[[", "]]" ) ] ),
+    "make":             Language( "make", **SH_STYLE ),
+    "YAML":             Language( "YAML", **SH_STYLE ),
+    "Qt Project":       Language( "Qt Project", **SH_STYLE ),
+    "Dockerfile":       Language( "Dockerfile", **SH_STYLE ),
+    "Ruby":             Language( "Ruby", line_comments=[ "#" ], block_comments=[ ( "=begin", "=end" ) ] ),
+    "Perl":             Language( "Perl", **SH_STYLE ),
+    "Lua":              Language( "Lua", line_comments=[ "--" ], block_comments=[ ( "--[[", "]]" ) ] ),
+    "SQL":              Language( "SQL", line_comments=[ "--" ], block_comments=[ ( "/*", "*/" ) ] ),
+    "TeX":              Language( "TeX", line_comments=[ "%" ] ),
+    "Markdown":         Language( "Markdown", block_comments=[ ( "<!--", "-->" ) ] ),
+    "DOS Batch":        Language( "DOS Batch", line_comments=[ "REM ", "rem ", "::" ] ),
+}
+
+
+EXTENSIONS = {
+    ".c": "C",
+    ".cpp": "C++", ".cc": "C++", ".cxx": "C++", ".c++": "C++",
+    ".h": "C/C++ Header", ".hpp": "C/C++ Header", ".hh": "C/C++ Header", ".hxx": "C/C++ Header",
+    ".java": "Java",
+    ".js": "JavaScript",
+    ".ts": "TypeScript",
+    ".rs": "Rust",
+    ".go": "Go",
+    ".cs": "C#",
+    ".css": "CSS",
+    ".scss": "SCSS",
+    ".py": "Python",
+    ".sh": "Bourne Shell",
+    ".bash": "Bourne Again Shell",
+    ".cmake": "CMake",
+    ".mk": "make",
+    ".yml": "YAML", ".yaml": "YAML",
+    ".pro": "Qt Project", ".pri": "Qt Project",
+    ".rb": "Ruby",
+    ".pl": "Perl", ".pm": "Perl",
+    ".lua": "Lua",
+    ".sql": "SQL",
+    ".tex": "TeX",
+    ".md": "Markdown",
+    ".bat": "DOS Batch", ".cmd": "DOS Batch",
+}
+
+FILE_NAMES = {
+    "CMakeLists.txt": "CMake",
+    "Makefile": "make",
+    "makefile": "make",
+    "Dockerfile": "Dockerfile",
+}
+
+## interpreters in '#!' line of files without extension (version suffix is skipped, e.g. 'python3.11')
+INTERPRETERS = {
+    "python": "Python",
+    "sh": "Bourne Shell",
+    "dash": "Bourne Shell",
+    "bash": "Bourne Again Shell",
+    "perl": "Perl",
+    "ruby": "Ruby",
+    "lua": "Lua",
+    "node": "JavaScript",
+    "make": "make",
+}
+
+
+## return language name for given file path or None if language is not recognized
+## content -- content of file (bytes or str), language of file without extension is detected by '#!' line
+def detect_language( path, content=None ):
+    file_name = os.path.basename( path )
+    language = FILE_NAMES.get( file_name )
+    if language is not None:
+        return language
+    _, ext = os.path.splitext( file_name )
+    if ext:
+        return EXTENSIONS.get( ext.lower() )
+    if content is None:
+        return None
+    return detect_shebang( content )
+
+
+## files without extension can be scripts, so content is needed to detect language
+def needs_content( path ):
+    file_name = os.path.basename( path )
+    return file_name not in FILE_NAMES and not os.path.splitext( file_name )[1]
+
+
+## return language of script from its '#!' line or None
+def detect_shebang( content ):
+    first_line = content[ :256 ]
+    if isinstance( first_line, bytes ):
+        first_line = first_line.decode( "utf8", errors="replace" )
+    first_line = first_line.split( "\n", 1 )[0]
+    if not first_line.startswith( "#!" ):
+        return None
+    args = first_line[ 2: ].split()
+    if args and os.path.basename( args[0] ) == "env":
+        ## e.g. '#!/usr/bin/env -S python3 -u', options and variables are skipped
+        args = [ item for item in args[ 1: ] if not item.startswith( "-" ) and "=" not in item ]
+    if not args:
+        return None
+    interpreter = os.path.basename( args[0] ).rstrip( "0123456789." )
+    return INTERPRETERS.get( interpreter )
+
+
+# ====================================================================
+
+
+## return tuple: (blank, comment, code) lines of given content
+def count_content( language_name, content ):
+    language = LANGUAGES[ language_name ]
+    if isinstance( content, bytes ):
+        content = content.decode( "utf8", errors="replace" )
+
+    blank   = 0
+    comment = 0
+    code    = 0
+    block_end = None            ## end marker of currently open block comment
+    for line in content.splitlines():
+        stripped = line.strip()
+        if not stripped:
+            blank += 1
+            continue
+        has_code, block_end = scan_line( stripped, language, block_end )
+        if has_code:
+            code += 1
+        else:
+            comment += 1
+    return ( blank, comment, code )
+
+
+## check if line contains code outside of comments
+## return tuple: (has_code, block_end) where 'block_end' is marker of comment continued in next line
+def scan_line( line, language, block_end ):
+    has_code = False
+    pos = 0
+    length = len( line )
+    while pos < length:
+        if block_end is not None:
+            end_index = line.find( block_end, pos )
+            if end_index < 0:
+                return ( has_code, block_end )
+            pos = end_index + len( block_end )
+            block_end = None
+            continue
+
+        ## find nearest comment marker
+        marker_index = length
+        marker_end   = None
+        is_line_comment = False
+        for marker in language.line_comments:
+            index = line.find( marker, pos )
+            if 0 <= index < marker_index:
+                marker_index = index
+                is_line_comment = True
+        for start_marker, end_marker in language.block_comments:
+            index = line.find( start_marker, pos )
+            if 0 <= index < marker_index or ( index == marker_index and is_line_comment and index >= 0 ):
+                ## block marker wins over line marker starting at the same position (e.g. '#[[' vs '#')
+                marker_index = index
+                marker_end   = ( start_marker, end_marker )
+                is_line_comment = False
+
+        if line[ pos : marker_index ].strip():
+            has_code = True
+        if marker_index >= length:
+            break
+        if is_line_comment:
+            break
+        pos = marker_index + len( marker_end[0] )
+        block_end = marker_end[1]
+    return ( has_code, block_end )
+
+
+## count single file, return tuple: (path, language, blank, comment, code, content_digest) or None
+def count_file( path ):
+    language = detect_language( path )
+    if language is None and not needs_content( path ):
+        return None
+    try:
+        with open( path, 'rb' ) as fp:
+            content = fp.read()
+    except OSError:
+        return None
+    if language is None:
+        language = detect_shebang( content )
+        if language is None:
+            return None
+    blank, comment, code = count_content( language, content )
+    digest = hashlib.md5( content ).hexdigest()
+    return ( path, language, blank, comment, code, digest )
+
+
+## item -- tuple: (key, file name, content)
+## return tuple: (key, code) -- code is 0 for unrecognized language
+def count_blob( item ):
+    key, file_name, content = item
+    language = detect_language( file_name, content )
+    if language is None:
+        return ( key, 0 )
+    return ( key, count_content( language, content )[2] )
+
+
+# ====================================================================
+
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_pool( jobs=None ):
+    global _POOL                      # pylint: disable=W0603
+    with _POOL_LOCK:
+        if _POOL is None:
+            ## forked worker would inherit pipes of git processes run by other threads and keep them open
+            context = multiprocessing.get_context( "spawn" )
+            _POOL = concurrent.futures.ProcessPoolExecutor( max_workers=jobs, mp_context=context )
+            atexit.register( shutdown_pool )
+        return _POOL
+
+
+def shutdown_pool():
+    global _POOL                      # pylint: disable=W0603
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.shutdown()
+            _POOL = None
+
+
+## map 'func' on items, in process pool if worth it
+def map_items( func, items, jobs=None ):
+    if jobs == 1 or len( items ) < 64:
+        return list( map( func, items ) )
+    pool = get_pool( jobs )
+    chunk_size = max( 1, len( items ) // ( 4 * ( pool._max_workers or 1 ) ) )     # pylint: disable=W0212
+    return list( pool.map( func, items, chunksize=chunk_size ) )
+
+
+## list files in directory skipping 'exclude_dirs'
+def list_files( root_dir, exclude_dirs=None ):
+    exclude_dirs = set( exclude_dirs or [] )
+    files_list = []
+    for dirpath, dirnames, filenames in os.walk( root_dir ):
+        dirnames[:] = [ item for item in dirnames if item not in exclude_dirs and not item.startswith( "." ) ]
+        for file_name in filenames:
+            files_list.append( os.path.join( dirpath, file_name ) )
+    return files_list
+
+
+## count lines of code in directory
+## return dict: language -> dict( files, blank, comment, code ) with 'SUM' entry (like cloc's JSON output)
+def count_directory( root_dir, exclude_langs=None, exclude_dirs=None, jobs=None ):
+    exclude_langs = set( exclude_langs or [] )
+    files_list = list_files( root_dir, exclude_dirs )
+    results = map_items( count_file, files_list, jobs )
+
+    summary = {}
+    total = { "nFiles": 0, "blank": 0, "comment": 0, "code": 0 }
+    visited = set()
+    for item in results:
+        if item is None:
+            continue
+        _, language, blank, comment, code, digest = item
+        if language in exclude_langs:
+            continue
+        if digest in visited:
+            ## duplicated files are counted once (as cloc does)
+            continue
+        visited.add( digest )
+        lang_data = summary.setdefault( language, { "nFiles": 0, "blank": 0, "comment": 0, "code": 0 } )
+        for data in ( lang_data, total ):
+            data[ "nFiles" ]  += 1
+            data[ "blank" ]   += blank
+            data[ "comment" ] += comment
+            data[ "code" ]    += code
+    summary[ "SUM" ] = total
+    return summary
@@ -0,0 +1,148 @@
+import logging
+import os
+import datetime
+import gzip
+import json
+
+
+_LOGGER = logging.getLogger(__name__)
+
+
+SNAPSHOT_SUFFIX = ".ndjson.gz"
+INDEX_SUFFIX    = ".index.json"
+
+
+# ====================================================================
+
+
+class ListingArchive():
+    """Snapshots of raw repositories listing returned by API.
+
+    Each snapshot is gzip-compressed NDJSON file (one repository per line)
+    with index file mapping repository name to position of its entry. Every
+    entry is compressed as separate gzip member, so whole snapshot can be
+    streamed with 'gzip'/'zcat' and single entry can be read without
+    decompressing the rest. Only 'keep' newest snapshots are retained.
+    """
+
+    def __init__(self, archive_dir, keep=5):
+        self.archive_dir = archive_dir
+        self.keep = keep
+
+    ## return writer of new snapshot, snapshot is published when writer is closed
+    def create(self):
+        os.makedirs( self.archive_dir, exist_ok=True )
+        timestamp = datetime.datetime.now().strftime( "%Y%m%d_%H%M%S_%f" )
+        snapshot_path = os.path.join( self.archive_dir, "listing_" + timestamp + SNAPSHOT_SUFFIX )
+        return ListingWriter( self, snapshot_path )
+
+    ## return list of snapshot paths, newest first
+    def snapshots(self):
+        if not os.path.isdir( self.archive_dir ):
+            return []
+        names = [ name for name in os.listdir( self.archive_dir ) if name.endswith( SNAPSHOT_SUFFIX ) ]
+        names.sort( reverse=True )
+        return [ os.path.join( self.archive_dir, name ) for name in names ]
+
+    def latest(self):
+        snapshots = self.snapshots()
+        if not snapshots:
+            return None
+        return snapshots[0]
+
+    ## remove snapshots (and their indexes) exceeding retention
+    def prune(self):
+        for snapshot_path in self.snapshots()[ self.keep: ]:
+            _LOGGER.info( "removing old listing snapshot: %s", snapshot_path )
+            for path in ( snapshot_path, get_index_path( snapshot_path ) ):
+                if os.path.exists( path ):
+                    os.remove( path )
+
+    ## return dict: repo name -> [ offset, length ] of compressed entry
+    def read_index(self, snapshot_path=None):
+        if snapshot_path is None:
+            snapshot_path = self.latest()
+            if snapshot_path is None:
+                return {}
+        with open( get_index_path( snapshot_path ), 'r', encoding='utf8' ) as fp:
+            return json.load( fp )
+
+    ## return listing entry of given repository, None if not found
+    def load_entry(self, repo_name, snapshot_path=None):
+        if snapshot_path is None:
+            snapshot_path = self.latest()
+            if snapshot_path is None:
+                return None
+        position = self.read_index( snapshot_path ).get( repo_name )
+        if position is None:
+            return None
+        offset, length = position
+        with open( snapshot_path, 'rb' ) as fp:
+            fp.seek( offset )
+            data = fp.read( length )
+        return json.loads( gzip.decompress( data ) )
+
+    ## yield entries of snapshot one by one
+    def iterate(self, snapshot_path=None):
+        if snapshot_path is None:
+            snapshot_path = self.latest()
+            if snapshot_path is None:
+                return
+        with gzip.open( snapshot_path, 'rt', encoding='utf8' ) as fp:
+            for line in fp:
+                yield json.loads( line )
+
+
+class ListingWriter():
+    """Writes entries of single snapshot.
+
+    Data is written to temporary files and moved in place on 'close()', so
+    interrupted run does not leave partial snapshot.
+    """
+
+    def __init__(self, archive, snapshot_path):
+        self.archive = archive
+        self.snapshot_path = snapshot_path
+        self.index = {}
+        self._tmp_path = snapshot_path + "_tmp"
+        self._file = open( self._tmp_path, 'wb' )     # pylint: disable=R1732
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+        return False
+
+    def add(self, repo_item):
+        line = json.dumps( repo_item, separators=( ',', ':' ) ) + "\n"
+        data = gzip.compress( line.encode( 'utf8' ), compresslevel=6, mtime=0 )
+        self.index[ repo_item["name"] ] = [ self._file.tell(), len( data ) ]
+        self._file.write( data )
+
+    def close(self):
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        index_path = get_index_path( self.snapshot_path )
+        with open( index_path + "_tmp", 'w', encoding='utf8' ) as fp:
+            json.dump( self.index, fp )
+        os.replace( index_path + "_tmp", index_path )
+        os.replace( self._tmp_path, self.snapshot_path )
+        _LOGGER.info( "listing of %s repositories stored to: %s", len( self.index ), self.snapshot_path )
+        self.archive.prune()
+
+    def discard(self):
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        os.remove( self._tmp_path )
+
+
+def get_index_path( snapshot_path ):
+    return snapshot_path[ : -len( SNAPSHOT_SUFFIX ) ] + INDEX_SUFFIX
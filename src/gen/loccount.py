@@ -0,0 +1,221 @@
+import logging
+import os
+import asyncio
+import threading
+import subprocess
+import tempfile
+import json
+
+import persist
+import linecounter
+
+
+_LOGGER = logging.getLogger(__name__)
+
+
+EXCLUDE_LANGS = [ "HTML", "JSON", "XML" ]
+EXCLUDE_DIRS  = [ "doc", "lib", "libs", "external", "build" ]
+
+
+# ====================================================================
+
+
+class BlobLocCache():
+    """Lines of code cached per file blob.
+
+    Language of file depends on its name, so entries are keyed by pair
+    (blob SHA, file name). Only blobs missing in cache are counted, total of
+    repository is sum of cached values.
+    """
+
+    ## engine -- 'cloc' or 'builtin' (see 'linecounter' module)
+    def __init__(self, cache_path, engine="cloc", jobs=None):
+        self.cache_path = cache_path
+        self.engine     = engine
+        self.jobs       = jobs
+        self._lock = threading.Lock()
+        self._counts = None
+        self._modified = False
+        self.hits   = 0
+        self.misses = 0
+
+    ## count lines of code of fetched HEAD in mirror, return "" on failure
+    async def count_tree(self, mirror, repoPath):
+        files_list = await mirror.list_tree( repoPath )
+        if files_list is None:
+            return ""
+        files_list = [ item for item in files_list if is_path_included( item[1] ) ]
+        missing = self._find_missing( files_list )
+        if missing:
+            _LOGGER.info( "counting lines of %s new blobs (%s cached)", len( missing ), len( files_list ) - len( missing ) )
+            new_counts = await count_blobs( mirror, repoPath, missing, self.engine, self.jobs )
+            if new_counts is None:
+                return ""
+            self._add_counts( new_counts )
+        return self._sum_counts( files_list )
+
+    ## read cache file (otherwise it is read on first use)
+    def load(self):
+        self._get_counts()
+
+    ## can be called in thread while counting continues, so lock is held only while data is copied
+    def store(self):
+        with self._lock:
+            if self._counts is None or self._modified is False:
+                return
+            counts = dict( self._counts )
+            self._modified = False
+        persist.store_object_simple( counts, self.cache_path )
+
+    def stats(self):
+        with self._lock:
+            size = 0 if self._counts is None else len( self._counts )
+        return { "hits": self.hits, "misses": self.misses, "entries": size }
+
+    ## return dict: blob key -> path of blobs not present in cache
+    def _find_missing(self, files_list):
+        counts = self._get_counts()
+        missing = {}
+        with self._lock:
+            for sha, path in files_list:
+                key = blob_key( sha, path )
+                if key in counts:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+                    missing[ key ] = path
+        return missing
+
+    def _add_counts(self, new_counts):
+        with self._lock:
+            self._counts.update( new_counts )
+            self._modified = True
+
+    ## identical files are counted once (same as cloc does)
+    def _sum_counts(self, files_list):
+        total = 0
+        visited = set()
+        with self._lock:
+            for sha, path in files_list:
+                if sha in visited:
+                    continue
+                visited.add( sha )
+                total += self._counts.get( blob_key( sha, path ), 0 )
+        return total
+
+    def _get_counts(self):
+        with self._lock:
+            if self._counts is None:
+                try:
+                    self._counts = persist.load_object_simple( self.cache_path, {}, silent=True )
+                except Exception:      # pylint: disable=W0703
+                    ## damaged cache -- blobs are counted again
+                    _LOGGER.warning( "unable to load loc cache: %s", self.cache_path )
+                    self._counts = {}
+            return self._counts
+
+
+def blob_key( sha, path ):
+    return sha + ":" + os.path.basename( path )
+
+
+## check 'EXCLUDE_DIRS' rule (directory of given name on any level)
+def is_path_included( path ):
+    dirs = path.split( "/" )[:-1]
+    for item in dirs:
+        if item in EXCLUDE_DIRS:
+            return False
+    return True
+
+
+## count lines of given blobs, git and cloc are run as asyncio subprocesses
+## missing -- dict: blob key -> path
+## return dict: blob key -> lines of code or None on failure
+async def count_blobs( mirror, repoPath, missing, engine="cloc", jobs=None ):
+    sha_paths = group_by_sha( missing )
+    blobs = await mirror.read_blobs( repoPath, list( sha_paths.keys() ) )
+    if engine == "builtin":
+        ## counting is CPU bound, so it is done outside of event loop
+        return await asyncio.to_thread( count_blobs_builtin, blobs, sha_paths, jobs )
+    return await count_blobs_cloc( blobs, sha_paths )
+
+
+## return dict: blob sha -> list of (blob key, path)
+def group_by_sha( missing ):
+    sha_paths = {}
+    for key, path in missing.items():
+        sha = key.split( ":", 1 )[0]
+        sha_paths.setdefault( sha, [] ).append( ( key, path ) )
+    return sha_paths
+
+
+## count blobs in process, without writing them to disk
+## blobs -- iterable of pairs (blob sha, content)
+def count_blobs_builtin( blobs, sha_paths, jobs=None ):
+    items = []
+    for sha, content in blobs:
+        for key, path in sha_paths[ sha ]:
+            if linecounter.detect_language( path, content ) in EXCLUDE_LANGS:
+                continue
+            items.append( ( key, os.path.basename( path ), content ) )
+
+    new_counts = { key: 0 for paths_list in sha_paths.values() for key, _ in paths_list }
+    for key, code in linecounter.map_items( linecounter.count_blob, items, jobs ):
+        new_counts[ key ] = code
+    return new_counts
+
+
+## count blobs with cloc
+## blobs -- list of pairs (blob sha, content)
+async def count_blobs_cloc( blobs, sha_paths ):
+    tmp_dir = tempfile.TemporaryDirectory()         # pylint: disable=R1732
+    try:
+        ## files are written and removed outside of event loop
+        path_keys = await asyncio.to_thread( write_blobs, blobs, sha_paths, tmp_dir.name )
+        try:
+            proc = await asyncio.create_subprocess_exec( *get_cloc_command( tmp_dir.name ), stdout=subprocess.PIPE )
+        except FileNotFoundError:
+            _LOGGER.warning( "cloc not found" )
+            return None
+        output, _ = await proc.communicate()
+        if proc.returncode != 0:
+            return None
+        return parse_cloc_output( output, sha_paths, path_keys )
+    finally:
+        await asyncio.to_thread( tmp_dir.cleanup )
+
+
+## write blobs to directory, return dict: file path -> blob key
+def write_blobs( blobs, sha_paths, output_dir ):
+    path_keys = {}
+    for sha, content in blobs:
+        for key, path in sha_paths[ sha ]:
+            file_path = os.path.join( output_dir, path )
+            os.makedirs( os.path.dirname( file_path ), exist_ok=True )
+            with open( file_path, 'wb' ) as fp:
+                fp.write( content )
+            path_keys[ os.path.normpath( file_path ) ] = key
+    return path_keys
+
+
+def get_cloc_command( directory ):
+    ## uniqueness is handled by caller, so all files have to be reported
+    return [ "cloc", "--skip-uniqueness", "--by-file", "--json",
+             "--exclude-lang=" + ",".join( EXCLUDE_LANGS ),
+             "--exclude-dir=" + ",".join( EXCLUDE_DIRS ),
+             directory ]
+
+
+## return dict: blob key -> lines of code
+def parse_cloc_output( output, sha_paths, path_keys ):
+    ## files not reported by cloc are not code (excluded or unknown language)
+    new_counts = { key: 0 for paths_list in sha_paths.values() for key, _ in paths_list }
+    if output.strip():
+        clocData = json.loads( output )
+        for file_path, file_data in clocData.items():
+            if file_path in ( "header", "SUM" ):
+                continue
+            key = path_keys.get( os.path.normpath( file_path ) )
+            if key is not None:
+                new_counts[ key ] = file_data[ "code" ]
+    return new_counts
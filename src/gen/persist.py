@@ -23,10 +23,19 @@
 
 import logging
 
+import sys
 import os
+import time
+import mmap
 import zipfile
-import filecmp
+import shutil
+import tempfile
 import pickle
+import hashlib
+import json
+import threading
+import copy
+import collections
 
 import abc
 
@@ -51,10 +60,14 @@ class RenamingUnpickler(pickle.Unpickler):
 def load_object( inputFile, codeVersion, defaultValue=None ):
     try:
         _LOGGER.info( "loading data from: %s", inputFile )
-        with open( inputFile, 'rb') as fp:
-            unpickler = RenamingUnpickler(codeVersion, fp)
-            return unpickler.load()
-#             return pickle.load(fp)
+
+        def read_object( filePath ):
+            with open( filePath, 'rb') as fp:
+                unpickler = RenamingUnpickler(codeVersion, fp)
+                return unpickler.load()
+#                 return pickle.load(fp)
+
+        return load_cached( inputFile, "renaming", read_object )
     except FileNotFoundError:
         _LOGGER.exception("failed to load")
         return defaultValue
@@ -66,42 +79,50 @@ def load_object( inputFile, codeVersion, defaultValue=None ):
         raise
 
 
-def store_object( inputObject, outputFile ):
-    tmpFile = outputFile + "_tmp"
-    store_object_simple( inputObject, tmpFile )
-
-    if os.path.isfile( outputFile ) is False:
-        ## output file does not exist -- rename file
-        _LOGGER.info( "saving data to: %s", outputFile )
-        os.rename( tmpFile, outputFile )
-        return True
+## store object only if its pickled data differs from content of output file
+## pickled data is hashed and compared with digest of stored file, so unchanged object is not written at all
+## fsync -- flush data to disk before replacing output file
+## returns True if data was stored, otherwise False
+def store_object( inputObject, outputFile, fsync=False ):
+    digestWriter = DigestWriter()
+    pickle.dump( inputObject, digestWriter )
+    newDigest = digestWriter.hexdigest()
 
-    if filecmp.cmp( tmpFile, outputFile ) is True:
-        ## the same files -- remove tmp file
+    if os.path.isfile( outputFile ) is True and get_file_digest( outputFile ) == newDigest:
         _LOGGER.info("no new data to store in %s", outputFile)
-        os.remove( tmpFile )
         return False
 
     _LOGGER.info( "saving data to: %s", outputFile )
-    os.remove( outputFile )
-    os.rename( tmpFile, outputFile )
+    outdirDir = os.path.dirname( outputFile )
+    if outdirDir and not os.path.exists(outdirDir):
+        os.makedirs(outdirDir, exist_ok=True)
+    tmpFile = outputFile + "_tmp"
+    with open( tmpFile, 'wb' ) as fp:
+        fp.writelines( digestWriter.chunks )
+        if fsync:
+            fp.flush()
+            os.fsync( fp.fileno() )
+    os.replace( tmpFile, outputFile )
+    store_file_digest( outputFile, newDigest )
+    invalidate_load_cache( outputFile )
     return True
 
 
-def store_backup( inputObject, outputFile ):
+## retention -- BackupRetention of backup versions (see 'backup_files()')
+## codec -- compression of backup archive (see 'BACKUP_CODECS')
+def store_backup( inputObject, outputFile, retention=None, codec="deflate" ):
     if store_object( inputObject, outputFile ) is False:
         return False
     ## backup data
     storedZipFile = outputFile + ".zip"
-    backup_files( [outputFile], storedZipFile )
+    backup_files( [outputFile], storedZipFile, retention, codec )
     return True
 
 
 def load_object_simple( inputFile, defaultValue=None, silent=False ):
     try:
 #         _LOGGER.info( "loading data from: %s", inputFile )
-        with open( inputFile, 'rb') as fp:
-            return pickle.load(fp)
+        return load_cached( inputFile, "simple", read_pickle )
     except AttributeError:
         if silent is False:
             _LOGGER.exception( "failed to load: %s", inputFile )
@@ -117,87 +138,618 @@ def load_object_simple( inputFile, defaultValue=None, silent=False ):
         return defaultValue
 
 
+## file is replaced atomically, so readers never see partially written data
+## temporary file has unique name, because the same file can be stored concurrently from many threads
 def store_object_simple( inputObject, outputFile ):
     outdirDir = os.path.dirname( outputFile )
-    if not os.path.exists(outdirDir):
+    if outdirDir and not os.path.exists(outdirDir):
         os.makedirs(outdirDir, exist_ok=True)
 
-    with open(outputFile, 'wb') as fp:
-        pickle.dump( inputObject, fp )
+    tmpFd, tmpFile = tempfile.mkstemp( prefix=os.path.basename( outputFile ) + "_", suffix="_tmp",
+                                       dir=outdirDir or os.curdir )
+    try:
+        with os.fdopen( tmpFd, 'wb' ) as fp:
+            pickle.dump( inputObject, fp )
+        os.replace( tmpFile, outputFile )
+    except BaseException:
+        if os.path.exists( tmpFile ):
+            os.remove( tmpFile )
+        raise
+    invalidate_load_cache( outputFile )
+
+
+def read_pickle( inputFile ):
+    with open( inputFile, 'rb') as fp:
+        return pickle.load(fp)
+
+
+## store given files as new backup version of 'outputArchive'
+## versions are kept in '<outputArchive>.d' directory: each distinct payload is stored once
+## (as '<digest>.zip') and list of versions is kept in 'versions.jsonl', old versions are never renamed
+## 'outputArchive' itself is updated to the latest version
+## archives made by previous versions ('outputArchive' and '<outputArchive>.N') are imported on first use
+## retention -- BackupRetention deciding which versions are kept (default: None -- all versions are kept)
+## codec -- compression of archive: 'none', 'deflate', 'lzma' or 'bz2', optionally with level (e.g. 'deflate:9')
+## returns True if new version was added
+def backup_files( inputFiles, outputArchive, retention=None, codec="deflate" ):
+    parse_codec( codec )       ## fail early on invalid codec
+    payloadDigest = calculate_files_digest( inputFiles )
+    import_legacy_backups( outputArchive )
+    versions = list_backups( outputArchive )
+    if versions and versions[-1]["digest"] == payloadDigest and os.path.isfile( outputArchive ):
+        _LOGGER.info("no new data to backup")
+        return False
 
+    backupDir = get_backup_dir( outputArchive )
+    objectPath = os.path.join( backupDir, payloadDigest + ".zip" )
+    if os.path.isfile( objectPath ) is False:
+        ## create zip
+        os.makedirs( backupDir, exist_ok=True )
+        tmpZipFile = objectPath + "_tmp"
+        try:
+            write_archive( inputFiles, tmpZipFile, codec )
+        except BaseException:
+            if os.path.exists( tmpZipFile ):
+                os.remove( tmpZipFile )
+            raise
+        os.replace( tmpZipFile, objectPath )
+    else:
+        ## the same payload as one of previous versions
+        _LOGGER.info( "reusing backup payload: %s", objectPath )
+
+    seq = versions[-1]["seq"] + 1 if versions else 1
+    version = { "seq": seq, "time": time.time(), "digest": payloadDigest }
+    with open( os.path.join( backupDir, BACKUP_VERSIONS_FILE ), 'a' ) as fp:
+        fp.write( json.dumps( version ) + "\n" )
+    versions.append( version )
+
+    _LOGGER.info( "storing data to: %s (version %s)", outputArchive, seq )
+    link_file( objectPath, outputArchive )
+    if retention is not None:
+        prune_backups( outputArchive, retention, versions )
+    return True
 
-def backup_files( inputFiles, outputArchive ):
-    ## create zip
-    tmpZipFile = outputArchive + "_tmp"
-    zipf = zipfile.ZipFile( tmpZipFile, 'w', zipfile.ZIP_DEFLATED )
-    for file in inputFiles:
-        zipEntry = os.path.basename( file )
-        zipf.write( file, zipEntry )
-    zipf.close()
-
-    ## compare content
-    storedZipFile = outputArchive
-    if os.path.isfile( storedZipFile ) is False:
-        ## output file does not exist -- rename file
-        _LOGGER.info( "storing data to: %s", storedZipFile )
-        os.rename( tmpZipFile, storedZipFile )
+
+## import archives rotated by previous implementation of 'backup_files()' into versions list
+## the oldest one is '<outputArchive>.N' with highest 'N', the newest one is 'outputArchive'
+def import_legacy_backups( outputArchive ):
+    backupDir = get_backup_dir( outputArchive )
+    versionsPath = os.path.join( backupDir, BACKUP_VERSIONS_FILE )
+    if os.path.isfile( versionsPath ):
+        return
+    archiveDir = os.path.dirname( outputArchive ) or "."
+    archivePrefix = os.path.basename( outputArchive ) + "."
+    numbered = []
+    if os.path.isdir( archiveDir ):
+        for name in os.listdir( archiveDir ):
+            suffix = name[ len( archivePrefix ): ]
+            if name.startswith( archivePrefix ) and suffix.isdigit():
+                numbered.append( ( int( suffix ), os.path.join( archiveDir, name ) ) )
+    numbered.sort( reverse=True )
+    legacyFiles = [ path for _, path in numbered ]
+    if os.path.isfile( outputArchive ):
+        legacyFiles.append( outputArchive )
+    if not legacyFiles:
         return
 
-    if filecmp.cmp( tmpZipFile, storedZipFile ) is True:
-        ## the same files -- remove tmp file
-        _LOGGER.info("no new data to backup")
-        os.remove( tmpZipFile )
+    os.makedirs( backupDir, exist_ok=True )
+    versions = []
+    for legacyPath in legacyFiles:
+        try:
+            payloadDigest = calculate_archive_digest( legacyPath )
+        except zipfile.BadZipFile:
+            _LOGGER.warning( "unable to import invalid backup archive: %s", legacyPath )
+            continue
+        version = { "seq": len( versions ) + 1, "time": os.path.getmtime( legacyPath ), "digest": payloadDigest }
+        objectPath = os.path.join( backupDir, payloadDigest + ".zip" )
+        if legacyPath == outputArchive:
+            ## latest version stays in place
+            if os.path.isfile( objectPath ) is False:
+                link_file( legacyPath, objectPath )
+        elif os.path.isfile( objectPath ):
+            os.remove( legacyPath )
+        else:
+            os.replace( legacyPath, objectPath )
+        versions.append( version )
+
+    with open( versionsPath + "_tmp", 'w' ) as fp:
+        for version in versions:
+            fp.write( json.dumps( version ) + "\n" )
+    os.replace( versionsPath + "_tmp", versionsPath )
+    _LOGGER.info( "imported %s legacy backups of: %s", len( versions ), outputArchive )
+
+
+## compression methods of backup archives
+BACKUP_CODECS = { "none":    zipfile.ZIP_STORED,
+                  "deflate": zipfile.ZIP_DEFLATED,
+                  "lzma":    zipfile.ZIP_LZMA,
+                  "bz2":     zipfile.ZIP_BZIP2 }
+
+
+## allowed compression levels of codecs
+CODEC_LEVELS = { "deflate": ( 0, 9 ),
+                 "bz2":     ( 1, 9 ) }
+
+
+## return tuple: (zipfile compression, compression level or None)
+def parse_codec( codec ):
+    name, _, level = codec.partition( ":" )
+    compression = BACKUP_CODECS.get( name )
+    if compression is None:
+        raise ValueError( f"unknown backup codec: {codec} (available: {', '.join( BACKUP_CODECS )})" )
+    if not level:
+        return ( compression, None )
+    levelRange = CODEC_LEVELS.get( name )
+    if levelRange is None:
+        raise ValueError( f"codec '{name}' does not accept compression level" )
+    try:
+        level = int( level )
+    except ValueError:
+        raise ValueError( f"invalid compression level of codec: {codec}" ) from None
+    if level < levelRange[0] or level > levelRange[1]:
+        raise ValueError( f"compression level of codec '{name}' has to be in range {levelRange[0]}-{levelRange[1]}: {codec}" )
+    return ( compression, level )
+
+
+## write files to zip archive compressing them with given codec
+## content of each file is streamed in chunks directly into archive
+def write_archive( inputFiles, outputArchive, codec="deflate" ):
+    compression, level = parse_codec( codec )
+    with zipfile.ZipFile( outputArchive, 'w', compression, compresslevel=level ) as zipf:
+        for file in inputFiles:
+            zipEntry = os.path.basename( file )
+            with open( file, 'rb' ) as inFile, zipf.open( zipEntry, 'w', force_zip64=True ) as outFile:
+                shutil.copyfileobj( inFile, outFile, CHUNK_SIZE )
+
+
+class BackupRetention():
+    """Policy deciding which backup versions are kept.
+
+    Kept are 'keepLast' newest versions, the newest version of each of
+    'keepDaily' last days and of each of 'keepWeekly' last weeks (days and
+    weeks having any version). 'keepLast=None' keeps all versions,
+    'keepDaily=None' / 'keepWeekly=None' keep the newest version of every
+    day / week, 0 disables given rule. The newest version is always kept
+    (even if all rules are disabled), because it is the current content of
+    backup archive.
+    """
+
+    def __init__(self, keepLast=10, keepDaily=7, keepWeekly=4):
+        self.keepLast   = keepLast
+        self.keepDaily  = keepDaily
+        self.keepWeekly = keepWeekly
+
+    ## versions -- list sorted from oldest to newest, returns list of sequence numbers to keep
+    def select(self, versions):
+        if self.keepLast is None:
+            return [ version["seq"] for version in versions ]
+        newestFirst = list( reversed( versions ) )
+        keep = set( version["seq"] for version in newestFirst[ :self.keepLast ] )
+        keep.update( _newest_per_period( newestFirst, self.keepDaily, "%Y-%m-%d" ) )
+        keep.update( _newest_per_period( newestFirst, self.keepWeekly, "%G-%V" ) )
+        if newestFirst:
+            keep.add( newestFirst[0]["seq"] )
+        return sorted( keep )
+
+
+def _newest_per_period( newestFirst, periodsNum, periodFormat ):
+    selected = []
+    periods = set()
+    for version in newestFirst:
+        if periodsNum is not None and len( periods ) >= periodsNum:
+            break
+        period = time.strftime( periodFormat, time.localtime( version["time"] ) )
+        if period in periods:
+            continue
+        periods.add( period )
+        selected.append( version["seq"] )
+    return selected
+
+
+BACKUP_VERSIONS_FILE = "versions.jsonl"
+
+
+def get_backup_dir( outputArchive ):
+    return outputArchive + ".d"
+
+
+## return list of backup versions sorted from oldest to newest
+## each version is dict: { seq, time, digest, path }
+def list_backups( outputArchive ):
+    backupDir = get_backup_dir( outputArchive )
+    versions = []
+    try:
+        with open( os.path.join( backupDir, BACKUP_VERSIONS_FILE ), 'r' ) as fp:
+            for line in fp:
+                try:
+                    version = json.loads( line )
+                except ValueError:
+                    ## interrupted write
+                    continue
+                version["path"] = os.path.join( backupDir, version["digest"] + ".zip" )
+                versions.append( version )
+    except FileNotFoundError:
+        pass
+    return versions
+
+
+## return backup version of given sequence number (latest if 'seq' is None), None if not found
+def get_backup( outputArchive, seq=None ):
+    versions = list_backups( outputArchive )
+    if not versions:
+        return None
+    if seq is None:
+        return versions[-1]
+    for version in versions:
+        if version["seq"] == seq:
+            return version
+    return None
+
+
+## extract files of backup version to given directory, returns list of extracted paths
+def restore_backup( outputArchive, outputDir, seq=None ):
+    version = get_backup( outputArchive, seq )
+    if version is None:
+        raise FileNotFoundError( f"backup version {seq} of {outputArchive} not found" )
+    _LOGGER.info( "restoring backup version %s to: %s", version["seq"], outputDir )
+    with zipfile.ZipFile( version["path"], 'r' ) as zipf:
+        return [ zipf.extract( name, outputDir ) for name in zipf.namelist() ]
+
+
+## load object from backup made by 'store_backup()'
+def load_backup_object( outputFile, seq=None, defaultValue=None ):
+    version = get_backup( outputFile + ".zip", seq )
+    if version is None:
+        return defaultValue
+    with zipfile.ZipFile( version["path"], 'r' ) as zipf:
+        with zipf.open( os.path.basename( outputFile ) ) as fp:
+            return pickle.load( fp )
+
+
+## remove versions not selected by retention policy and payloads not used by any version
+def prune_backups( outputArchive, retention, versions=None ):
+    if versions is None:
+        versions = list_backups( outputArchive )
+    keep = set( retention.select( versions ) )
+    if len( keep ) == len( versions ):
         return
+    backupDir = get_backup_dir( outputArchive )
+    kept = [ version for version in versions if version["seq"] in keep ]
+    versionsPath = os.path.join( backupDir, BACKUP_VERSIONS_FILE )
+    with open( versionsPath + "_tmp", 'w' ) as fp:
+        for version in kept:
+            record = { key: value for key, value in version.items() if key != "path" }
+            fp.write( json.dumps( record ) + "\n" )
+    os.replace( versionsPath + "_tmp", versionsPath )
+
+    usedDigests = set( version["digest"] for version in kept )
+    for version in versions:
+        digest = version["digest"]
+        if digest in usedDigests:
+            continue
+        usedDigests.add( digest )       ## remove once
+        _LOGGER.info( "removing old backup version %s", version["seq"] )
+        objectPath = os.path.join( backupDir, digest + ".zip" )
+        if os.path.isfile( objectPath ):
+            os.remove( objectPath )
+
+
+## digest of names and content of files
+def calculate_files_digest( inputFiles ):
+    hasher = hashlib.sha256()
+    for file in inputFiles:
+        with open( file, 'rb' ) as fp:
+            _update_payload_digest( hasher, os.path.basename( file ), os.path.getsize( file ), fp )
+    return hasher.hexdigest()
+
+
+## digest of archive entries, the same as digest of files the archive was made of
+def calculate_archive_digest( archivePath ):
+    hasher = hashlib.sha256()
+    with zipfile.ZipFile( archivePath, 'r' ) as zipf:
+        for info in zipf.infolist():
+            with zipf.open( info ) as fp:
+                _update_payload_digest( hasher, info.filename, info.file_size, fp )
+    return hasher.hexdigest()
+
+
+def _update_payload_digest( hasher, name, size, fileObject ):
+    hasher.update( name.encode( 'utf8' ) + b"\0" )
+    hasher.update( str( size ).encode( 'utf8' ) + b"\0" )
+    while True:
+        chunk = fileObject.read( CHUNK_SIZE )
+        if not chunk:
+            break
+        hasher.update( chunk )
+
+
+## make 'targetPath' the same file as 'sourcePath' (hard link, copy if links are not supported)
+def link_file( sourcePath, targetPath ):
+    tmpPath = targetPath + "_tmp"
+    if os.path.exists( tmpPath ):
+        os.remove( tmpPath )
+    try:
+        os.link( sourcePath, tmpPath )
+    except OSError:
+        shutil.copyfile( sourcePath, tmpPath )
+    os.replace( tmpPath, targetPath )
+
+
+## ==========================================================
+
 
-    ## rename files
-    counter = 1
-    nextFile = "%s.%s" % (storedZipFile, counter)
-    while os.path.isfile( nextFile ):
-        counter += 1
-        nextFile = "%s.%s" % (storedZipFile, counter)
-    _LOGGER.info( "found backup slot: %s", nextFile )
-
-    currFile = storedZipFile
-    while counter > 1:
-        currFile = "%s.%s" % (storedZipFile, counter - 1)
-        os.rename( currFile, nextFile )
-        nextFile = currFile
-        counter -= 1
-
-    os.rename( storedZipFile, nextFile )
-    os.rename( tmpZipFile, storedZipFile )
-
-
-def compare_files_bytes( file1Path, file2Path ):
-    contentA = read_file_bytes( file1Path )
-    contentB = read_file_bytes( file2Path )
-    aSize = len( contentA )
-    bSize = len( contentB )
+class LoadCache():
+    """LRU cache of loaded objects validated by file modification time and size.
+
+    Entry is valid as long as '(st_mtime_ns, st_size)' of file did not change.
+    Cache is bounded by number of entries and by total size of loaded files
+    (used as estimate of memory taken by objects). With 'copyResult' each
+    call returns deep copy of cached object, otherwise cached object is
+    shared, so it must not be modified by callers.
+    """
+
+    def __init__(self, maxEntries=128, maxBytes=256 * 1024 * 1024, copyResult=False):
+        self.maxEntries = maxEntries
+        self.maxBytes   = maxBytes
+        self.copyResult = copyResult
+        self.hits   = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()       ## (path, loader) -> (mtime_ns, size, object)
+        self._bytes = 0
+
+    ## return object loaded from file by 'readFunc', cached object if file did not change
+    def load(self, filePath, loaderName, readFunc):
+        filePath = os.path.abspath( filePath )
+        fileStat = os.stat( filePath )
+        key = ( filePath, loaderName )
+        with self._lock:
+            entry = self._entries.get( key )
+            if entry is not None and entry[0] == fileStat.st_mtime_ns and entry[1] == fileStat.st_size:
+                self._entries.move_to_end( key )
+                self.hits += 1
+                return self._result( entry[2] )
+            self.misses += 1
+
+        loadedObject = readFunc( filePath )
+        with self._lock:
+            self._remove( key )
+            if fileStat.st_size <= self.maxBytes:
+                self._entries[ key ] = ( fileStat.st_mtime_ns, fileStat.st_size, loadedObject )
+                self._bytes += fileStat.st_size
+                self._evict()
+        return self._result( loadedObject )
+
+    ## remove entries of given file
+    def invalidate(self, filePath):
+        filePath = os.path.abspath( filePath )
+        with self._lock:
+            for key in [ key for key in self._entries if key[0] == filePath ]:
+                self._remove( key )
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return { "hits": self.hits, "misses": self.misses,
+                     "entries": len( self._entries ), "bytes": self._bytes }
+
+    def _result(self, loadedObject):
+        if self.copyResult:
+            return copy.deepcopy( loadedObject )
+        return loadedObject
+
+    def _remove(self, key):
+        entry = self._entries.pop( key, None )
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def _evict(self):
+        while self._entries and ( len( self._entries ) > self.maxEntries or self._bytes > self.maxBytes ):
+            _, entry = self._entries.popitem( last=False )
+            self._bytes -= entry[1]
+
+
+## cache of loaded objects, disabled (None) by default
+LOAD_CACHE = None
+
+
+## enable process-wide cache of 'load_object()' and 'load_object_simple()'
+def enable_load_cache( maxEntries=128, maxBytes=256 * 1024 * 1024, copyResult=False ):
+    # pylint: disable=W0603
+    global LOAD_CACHE
+    LOAD_CACHE = LoadCache( maxEntries, maxBytes, copyResult )
+    return LOAD_CACHE
+
+
+def disable_load_cache():
+    # pylint: disable=W0603
+    global LOAD_CACHE
+    LOAD_CACHE = None
+
+
+## return dict with hits and misses of cache, None if cache is disabled
+def load_cache_stats():
+    cache = LOAD_CACHE
+    if cache is None:
+        return None
+    return cache.stats()
+
+
+def load_cached( inputFile, loaderName, readFunc ):
+    cache = LOAD_CACHE
+    if cache is None:
+        return readFunc( inputFile )
+    return cache.load( inputFile, loaderName, readFunc )
+
+
+def invalidate_load_cache( filePath ):
+    cache = LOAD_CACHE
+    if cache is not None:
+        cache.invalidate( filePath )
+
+
+## ==========================================================
+
+
+class DigestWriter():
+    """File-like object hashing written data.
+
+    Written chunks are kept, so data can be stored to file without pickling
+    it again.
+    """
+
+    def __init__(self):
+        self.hasher = hashlib.sha256()
+        self.chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self.hasher.update( data )
+        self.chunks.append( data )
+        self.size += len( data )
+        return len( data )
+
+    def hexdigest(self):
+        return self.hasher.hexdigest()
+
+
+## digests of stored files: file path -> (mtime_ns, size, digest)
+_DIGEST_LOCK = threading.Lock()
+_FILE_DIGESTS = {}
+
+
+## return digest of file content
+## digest is taken from memory or from sidecar file ('<file>.digest') if file was not modified since
+## digest was calculated, otherwise file is hashed (e.g. file stored by older version)
+def get_file_digest( filePath ):
+    fileStat = os.stat( filePath )
+    with _DIGEST_LOCK:
+        entry = _FILE_DIGESTS.get( filePath )
+    if entry is not None and entry[0] == fileStat.st_mtime_ns and entry[1] == fileStat.st_size:
+        return entry[2]
+
+    digest = None
+    sidecar = load_digest_sidecar( filePath )
+    if sidecar is not None and sidecar.get( "mtime_ns" ) == fileStat.st_mtime_ns and sidecar.get( "size" ) == fileStat.st_size:
+        digest = sidecar.get( "digest" )
+    if digest is None:
+        digest = calculate_file_digest( filePath )
+    with _DIGEST_LOCK:
+        _FILE_DIGESTS[ filePath ] = ( fileStat.st_mtime_ns, fileStat.st_size, digest )
+    return digest
+
+
+## remember digest of just stored file and write it to sidecar file
+def store_file_digest( filePath, digest ):
+    fileStat = os.stat( filePath )
+    with _DIGEST_LOCK:
+        _FILE_DIGESTS[ filePath ] = ( fileStat.st_mtime_ns, fileStat.st_size, digest )
+    sidecar = { "digest": digest, "mtime_ns": fileStat.st_mtime_ns, "size": fileStat.st_size }
+    sidecarPath = filePath + ".digest"
+    with open( sidecarPath + "_tmp", 'w' ) as fp:
+        json.dump( sidecar, fp )
+    os.replace( sidecarPath + "_tmp", sidecarPath )
+
+
+def load_digest_sidecar( filePath ):
+    try:
+        with open( filePath + ".digest", 'r' ) as fp:
+            return json.load( fp )
+    except (OSError, ValueError):
+        return None
+
+
+def calculate_file_digest( filePath ):
+    hasher = hashlib.sha256()
+    with open( filePath, 'rb' ) as fp:
+        while True:
+            chunk = fp.read( CHUNK_SIZE )
+            if not chunk:
+                break
+            hasher.update( chunk )
+    return hasher.hexdigest()
+
+
+## files are compared and dumped in chunks of given size, so memory usage does not depend on file size
+CHUNK_SIZE = 1024 * 1024
+
+
+## log and return list of offsets of differing bytes, None if files size differ
+def compare_files_bytes( file1Path, file2Path, firstOnly=False ):
+    aSize = os.path.getsize( file1Path )
+    bSize = os.path.getsize( file2Path )
     if aSize != bSize:
         _LOGGER.info( "files size differ: %s %s", aSize, bSize )
-        return
-    for i in range(aSize):
-        if contentA[i] != contentB[i]:
-            _LOGGER.info( "files differ at byte %s: %s %s", i, contentA[i], contentB[i] )
+        return None
+    offsets = []
+    if aSize == 0:
+        return offsets
+    with open( file1Path, 'rb' ) as fileA, open( file2Path, 'rb' ) as fileB:
+        contentA = map_file( fileA )
+        contentB = map_file( fileB )
+        try:
+            for i in find_diff_offsets( contentA, contentB ):
+                _LOGGER.info( "files differ at byte %s: %s %s", i, contentA[i], contentB[i] )
+                offsets.append( i )
+                if firstOnly:
+                    break
+        finally:
+            contentA.close()
+            contentB.close()
+    return offsets
+
+
+## yield offsets of differing bytes of two buffers (e.g. 'mmap') of the same size
+## buffers are compared chunk by chunk, bytes are compared only inside differing chunks
+## (slices are compared with 'memcmp', comparing 'memoryview' slices is a few times slower)
+def find_diff_offsets( contentA, contentB, chunkSize=CHUNK_SIZE ):
+    yield from _find_diff_in_range( contentA, contentB, 0, len( contentA ), chunkSize )
+
+
+def _find_diff_in_range( contentA, contentB, start, end, chunkSize ):
+    for chunkStart in range( start, end, chunkSize ):
+        chunkEnd = min( chunkStart + chunkSize, end )
+        if contentA[ chunkStart:chunkEnd ] == contentB[ chunkStart:chunkEnd ]:
+            continue
+        if chunkEnd - chunkStart <= 64:
+            for i in range( chunkStart, chunkEnd ):
+                if contentA[i] != contentB[i]:
+                    yield i
+            continue
+        ## narrow down differing chunk
+        yield from _find_diff_in_range( contentA, contentB, chunkStart, chunkEnd, max( 64, chunkSize // 16 ) )
+
+
+## print hex dump of file, each row: 'offset: bytes'
+def print_file_content( filePath, rowSize=16, outStream=None ):
+    if outStream is None:
+        outStream = sys.stdout
+    offset = 0
+    chunkSize = CHUNK_SIZE - CHUNK_SIZE % rowSize
+    with open( filePath, 'rb' ) as fp:
+        while True:
+            chunk = fp.read( chunkSize )
+            if not chunk:
+                break
+            view = memoryview( chunk )
+            rows = [ '{:06d}: {}\n'.format( offset + i, view[ i:i + rowSize ].hex( ' ' ) )
+                     for i in range( 0, len( view ), rowSize ) ]
+            outStream.writelines( rows )
+            offset += len( chunk )
 
 
-def print_file_content( filePath ):
-    byteList = read_file_bytes( filePath )
-    #return ''.join('{:02x} '.format(x) for x in byteList)
-    bSize = len( byteList )
-    for i in range(bSize):
-        print( ''.join( '{:06d}: {:02x}'.format( i, byteList[i] ) ) )
+def read_file_bytes( filePath ):
+    with open( filePath, 'rb' ) as f:
+        return f.read()
 
 
-def read_file_bytes( filePath ):
-    byteList = []
-    with open(filePath, 'rb') as f:
-        while 1:
-            byte_s = f.read(1)
-            if not byte_s:
-                break
-            byteList.append( byte_s[0] )
-    return byteList
+## return read-only memory map of file (empty file can't be mapped)
+def map_file( fileObject ):
+    return mmap.mmap( fileObject.fileno(), 0, access=mmap.ACCESS_READ )
 
 
 ## ==========================================================
@@ -0,0 +1,153 @@
+import logging
+import asyncio
+import threading
+import time
+import random
+
+
+_LOGGER = logging.getLogger(__name__)
+
+
+# ====================================================================
+
+
+class RateLimitScheduler():
+    """Schedule requests according to GitHub rate limit headers.
+
+    While budget is plentiful requests are sent without delay. When remaining
+    budget drops below 'throttle_ratio' of the limit, requests are spread evenly
+    until reset time. Exhausted limit is waited out until reset.
+    """
+
+    def __init__(self, max_retries=5, throttle_ratio=0.2, max_backoff=300.0):
+        self.max_retries    = max_retries
+        self.throttle_ratio = throttle_ratio
+        self.max_backoff    = max_backoff
+        self._lock = threading.Lock()
+
+        self.limit     = None
+        self.remaining = None
+        self.reset_time = None          ## epoch seconds
+        self._next_slot = 0.0           ## monotonic time of next allowed request
+
+        self.budget_used = 0
+        self.requests_num = 0
+        self.retries_num  = 0
+        self.wait_time    = 0.0
+
+    ## wait until request is allowed
+    async def acquire_async(self):
+        sleep_time = self._reserve()
+        if sleep_time > 0:
+            _LOGGER.debug( "throttling request for %.2fs", sleep_time )
+            await self.wait_async( sleep_time )
+
+    ## update state from response, return delay before retry or None if response is final
+    def process_response(self, status, headers, attempt=0):
+        self._update_limits( headers )
+
+        if status in ( 403, 429 ):
+            retry_after = parse_int( headers.get( "Retry-After" ) )
+            if retry_after is not None:
+                ## secondary rate limit
+                return self._retry_delay( retry_after, attempt )
+            resp_remaining = parse_int( headers.get( "X-RateLimit-Remaining" ) )
+            if resp_remaining == 0 and self.reset_time is not None:
+                ## primary limit exhausted -- wait for reset, not limited by 'max_retries'
+                delay = max( 0.0, self.reset_time - time.time() ) + 1.0
+                _LOGGER.warning( "rate limit exhausted, waiting %.0fs for reset", delay )
+                with self._lock:
+                    self.retries_num += 1
+                return delay
+            if status == 429:
+                return self._retry_delay( self._backoff( attempt ), attempt )
+            ## other forbidden reason
+            return None
+
+        if status >= 500:
+            return self._retry_delay( self._backoff( attempt ), attempt )
+
+        return None
+
+    def stats(self):
+        return { "requests": self.requests_num,
+                 "budget_used": self.budget_used,
+                 "remaining": self.remaining,
+                 "limit": self.limit,
+                 "retries": self.retries_num,
+                 "wait_time": round( self.wait_time, 2 ) }
+
+    def log_usage(self):
+        _LOGGER.info( "rate limit usage: %s", self.stats() )
+
+    ## reserve slot for request, return time to wait for the slot
+    def _reserve(self):
+        with self._lock:
+            reset_wait, interval = self._calculate_delay()
+            now = time.monotonic()
+            start = max( now + reset_wait, self._next_slot )
+            self._next_slot = start + interval
+            self.requests_num += 1
+        return start - time.monotonic()
+
+    ## return tuple: (wait for reset, interval between requests)
+    def _calculate_delay(self):
+        if self.remaining is None or self.reset_time is None or self.limit is None:
+            return ( 0.0, 0.0 )
+        time_to_reset = self.reset_time - time.time()
+        if time_to_reset <= 0:
+            ## limit already reset
+            return ( 0.0, 0.0 )
+        if self.remaining <= 0:
+            return ( time_to_reset + 1.0, 0.0 )
+        if self.remaining > self.limit * self.throttle_ratio:
+            return ( 0.0, 0.0 )
+        ## spread remaining requests evenly until reset
+        return ( 0.0, time_to_reset / self.remaining )
+
+    def _update_limits(self, headers):
+        remaining = parse_int( headers.get( "X-RateLimit-Remaining" ) )
+        if remaining is None:
+            return
+        limit = parse_int( headers.get( "X-RateLimit-Limit" ) )
+        reset = parse_int( headers.get( "X-RateLimit-Reset" ) )
+        with self._lock:
+            if self.remaining is not None:
+                if remaining < self.remaining:
+                    self.budget_used += self.remaining - remaining
+                elif reset is not None and self.reset_time is not None and reset > self.reset_time:
+                    ## limit has been reset in the meantime
+                    self.budget_used += max( 0, ( limit or remaining ) - remaining )
+            else:
+                self.budget_used += 1
+            self.remaining  = remaining
+            self.limit      = limit
+            self.reset_time = reset
+
+    def _retry_delay(self, delay, attempt):
+        if attempt >= self.max_retries:
+            _LOGGER.warning( "max retries (%s) reached", self.max_retries )
+            return None
+        with self._lock:
+            self.retries_num += 1
+        return delay
+
+    ## exponential backoff with full jitter
+    def _backoff(self, attempt):
+        cap = min( self.max_backoff, 2.0 ** attempt )
+        return random.uniform( 0, cap ) + 0.5
+
+    ## sleep before request or retry, without blocking event loop
+    async def wait_async(self, delay):
+        with self._lock:
+            self.wait_time += delay
+        await asyncio.sleep( delay )
+
+
+def parse_int( value ):
+    if value is None:
+        return None
+    try:
+        return int( value )
+    except ValueError:
+        return None
@@ -0,0 +1,141 @@
+import logging
+import time
+import gzip
+import json
+import hashlib
+
+import httpclient
+
+
+_LOGGER = logging.getLogger(__name__)
+
+
+# ====================================================================
+
+
+class RecordingClient( httpclient.HttpClient ):
+    """Client passing requests to other client and recording exchanges.
+
+    Exchanges (method, URL, status, headers, body and duration) are written
+    to gzip-compressed file, one JSON object per line.
+    """
+
+    def __init__(self, client, archive_path):
+        super().__init__()
+        self.client = client
+        self.archive_path = archive_path
+        self._file = gzip.open( archive_path, 'wt', encoding='utf8' )
+        _LOGGER.info( "recording HTTP exchanges to: %s", archive_path )
+
+    def get(self, url, headers=None):
+        return self._record( "GET", url, None, lambda: self.client.get( url, headers ) )
+
+    def post(self, url, data, headers=None):
+        return self._record( "POST", url, data, lambda: self.client.post( url, data, headers ) )
+
+    def close(self):
+        with self._stats_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        self.client.close()
+
+    def stats(self):
+        stats = self.client.stats()
+        stats[ "recorded" ] = self.requests_num
+        return stats
+
+    def _record(self, method, url, data, send_func):
+        self._count_request()
+        start_time = time.perf_counter()
+        response = send_func()
+        duration = time.perf_counter() - start_time
+        content = response[1]
+        if isinstance( content, bytes ):
+            content = content.decode( 'utf8', errors='replace' )
+        exchange = { "method": method,
+                     "url": url,
+                     "data": data_digest( data ),
+                     "status": response[0],
+                     "headers": list( response[2].items() ),
+                     "content": content,
+                     "duration": round( duration, 6 ) }
+        line = json.dumps( exchange ) + "\n"
+        with self._stats_lock:
+            if self._file is not None:
+                self._file.write( line )
+        return response
+
+
+# ====================================================================
+
+
+class ReplayClient( httpclient.HttpClient ):
+    """Client serving exchanges recorded by 'RecordingClient', without network.
+
+    Repeated requests of the same URL are served in recorded order (e.g. 202
+    followed by 200), the last exchange is repeated when sequence is exhausted.
+
+    latency -- None (no delay), 'recorded' (sleep recorded duration) or number of seconds
+    """
+
+    def __init__(self, archive_path, latency=None):
+        super().__init__()
+        self.archive_path = archive_path
+        self.latency = latency
+        self.missing_num = 0
+        self._exchanges = {}
+        self._positions = {}
+        with gzip.open( archive_path, 'rt', encoding='utf8' ) as archive_file:
+            for line in archive_file:
+                if not line.strip():
+                    continue
+                exchange = json.loads( line )
+                key = ( exchange["method"], exchange["url"], exchange["data"] )
+                self._exchanges.setdefault( key, [] ).append( exchange )
+        _LOGGER.info( "replaying %s URLs from: %s", len( self._exchanges ), archive_path )
+
+    def get(self, url, headers=None):
+        return self._replay( "GET", url, None )
+
+    def post(self, url, data, headers=None):
+        return self._replay( "POST", url, data )
+
+    def stats(self):
+        return { "requests": self.requests_num, "missing": self.missing_num }
+
+    def _replay(self, method, url, data):
+        self._count_request()
+        key = ( method, url, data_digest( data ) )
+        with self._stats_lock:
+            exchanges = self._exchanges.get( key )
+            if not exchanges:
+                self.missing_num += 1
+                exchange = None
+            else:
+                position = self._positions.get( key, 0 )
+                exchange = exchanges[ min( position, len( exchanges ) - 1 ) ]
+                self._positions[ key ] = position + 1
+
+        if exchange is None:
+            _LOGGER.warning( "no recorded exchange for: %s %s", method, url )
+            body = json.dumps( { "message": "Not Found (not recorded)" } )
+            return [ 404, body, httpclient.make_headers( [] ) ]
+
+        delay = None
+        if self.latency == "recorded":
+            delay = exchange["duration"]
+        elif self.latency is not None:
+            delay = float( self.latency )
+        if delay:
+            time.sleep( delay )
+        return [ exchange["status"], exchange["content"], httpclient.make_headers( exchange["headers"] ) ]
+
+
+## request body is stored as digest, it is only needed to match requests
+def data_digest( data ):
+    if data is None:
+        return None
+    if isinstance( data, str ):
+        data = data.encode( 'utf8' )
+    return hashlib.sha1( data ).hexdigest()
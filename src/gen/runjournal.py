@@ -0,0 +1,114 @@
+import logging
+import os
+import threading
+import time
+import json
+
+
+_LOGGER = logging.getLogger(__name__)
+
+
+# ====================================================================
+
+
+class RunJournal():
+    """Append-only journal of scraping run, one JSON object per line.
+
+    Each repository is recorded as soon as it is finished (CSV row) or failed
+    (error message), so interrupted run can be resumed without scraping
+    finished repositories again. Records of resumed run are appended to the
+    same file, later records override earlier ones.
+    """
+
+    def __init__(self, journal_path):
+        self.journal_path = journal_path
+        self._lock = threading.Lock()
+        self._file = None
+        self.rows = {}              ## repo name -> CSV row
+        self.failures = {}          ## repo name -> error message
+        self.completed = False
+        self.records_num = 0        ## number of repositories recorded by current run
+
+    ## resume -- continue previous journal, otherwise start from scratch
+    def start(self, resume=False, **info):
+        with self._lock:
+            self.rows = {}
+            self.failures = {}
+            self.completed = False
+            self.records_num = 0
+            if resume:
+                self._load()
+                if self.completed:
+                    ## nothing to continue
+                    _LOGGER.warning( "previous run was completed, starting new run" )
+                    self.rows = {}
+                    self.failures = {}
+                    resume = False
+            if resume:
+                _LOGGER.info( "resuming run: %s finished, %s failed", len( self.rows ), len( self.failures ) )
+                mode = 'a'
+                record_type = "resume"
+            else:
+                mode = 'w'
+                record_type = "start"
+            journal_dir = os.path.dirname( self.journal_path )
+            if journal_dir:
+                os.makedirs( journal_dir, exist_ok=True )
+            self._file = open( self.journal_path, mode, encoding='utf8' )       # pylint: disable=R1732
+            self.completed = False
+            self._write( dict( info, type=record_type, time=time.time() ) )
+
+    ## return number of repositories recorded by current run
+    def done(self, name, row):
+        with self._lock:
+            self.rows[ name ] = row
+            self.failures.pop( name, None )
+            self._write( { "type": "done", "name": name, "row": row } )
+            self.records_num += 1
+            return self.records_num
+
+    ## return number of repositories recorded by current run
+    def failed(self, name, error):
+        with self._lock:
+            self.failures[ name ] = error
+            self._write( { "type": "failed", "name": name, "error": error } )
+            self.records_num += 1
+            return self.records_num
+
+    ## mark run as finished (all repositories processed and output written)
+    def complete(self):
+        with self._lock:
+            self.completed = True
+            self._write( { "type": "complete", "time": time.time(), "failed": len( self.failures ) } )
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _write(self, record):
+        if self._file is None:
+            return
+        ## flushed immediately, so records survive interrupted run
+        self._file.write( json.dumps( record ) + "\n" )
+        self._file.flush()
+
+    def _load(self):
+        if not os.path.isfile( self.journal_path ):
+            return
+        with open( self.journal_path, 'r', encoding='utf8' ) as fp:
+            for line in fp:
+                try:
+                    record = json.loads( line )
+                except ValueError:
+                    ## last line of killed run can be truncated
+                    continue
+                record_type = record.get( "type" )
+                if record_type == "done":
+                    self.rows[ record["name"] ] = record["row"]
+                    self.failures.pop( record["name"], None )
+                elif record_type == "failed":
+                    self.failures[ record["name"] ] = record["error"]
+                elif record_type == "complete":
+                    self.completed = True
@@ -0,0 +1,722 @@
+import os
+import logging
+import asyncio
+import contextlib
+import csv
+import collections
+import pprint
+import time
+import json
+
+import httpclient
+import githubgraphql
+import tracing
+import scrapestate
+
+
+_LOGGER = logging.getLogger(__name__)
+
+
+# ====================================================================
+
+
+## jobs -- max number of repositories scraped concurrently (0 means no limit, only HTTP and subprocess limits apply)
+## stats_timeout -- how long (in seconds) to wait for deferred statistics
+## api -- 'rest' or 'graphql' (reads metadata and commits number of many repositories in single request)
+## http_limit, subprocess_limit -- max number of concurrent HTTP requests and git/cloc processes
+## resume -- continue interrupted run: repositories finished by previous run are taken from journal,
+##           failed and not processed ones are scraped
+def read_repositories( jobs=0, stats_timeout=60.0, api="rest", http_limit=8, subprocess_limit=16, resume=False ):
+    if api == "graphql":
+        _LOGGER.info( "reading repos from: %s", githubgraphql.GRAPHQL_URL )
+    else:
+        _LOGGER.info( "reading repos from: %s", scrapestate.REPOS_URL )
+
+    os.makedirs( scrapestate.CACHE_DIR, exist_ok=True )
+    scrapestate.open_repo_cache()
+    run_journal = scrapestate.get_run_journal()
+    run_journal.start( resume=resume, api=api )
+    try:
+        scrape_repositories( jobs, stats_timeout, api, http_limit, subprocess_limit )
+    finally:
+        ## work done so far is kept even if run is interrupted
+        store_caches()
+        run_journal.close()
+
+    httpclient.log_stats()
+    _LOGGER.info( "http cache stats: %s", scrapestate.get_http_cache().stats() )
+    scrapestate.get_rate_limiter().log_usage()
+    _LOGGER.info( "repo cache stats: %s", scrapestate.get_repo_cache().stats() )
+    _LOGGER.info( "loc cache stats: %s", scrapestate.get_loc_cache().stats() )
+    if run_journal.failures:
+        _LOGGER.warning( "unable to read %s repositories (run with '--resume' to retry): %s",
+                         len( run_journal.failures ), sorted( run_journal.failures ) )
+    _LOGGER.info( "done" )
+
+
+def scrape_repositories( jobs, stats_timeout, api, http_limit, subprocess_limit ):
+    header = [ 'name', 'category', 'summary', 'create_date', 'push_date', 'stars', 'commits', 'loc' ]
+
+    ## rows are written to temporary file first, so previous output is kept if run fails
+    tmp_csv_path = scrapestate.OUTPUT_CSV + "_tmp"
+    listing_archive = scrapestate.get_listing_archive()
+    with open( tmp_csv_path, 'w', encoding='UTF8' ) as csv_file, listing_archive.create() as listing_writer:
+        writer = csv.writer( csv_file, delimiter=',', quoting=csv.QUOTE_ALL )
+        writer.writerow( header )
+
+        ## failed repositories without data from previous runs
+        missing_repos = []
+
+        def write_result( repo_item, row ):
+            if row is None:
+                row = get_cached_row( repo_item["name"] )
+                if row is None:
+                    missing_repos.append( repo_item["name"] )
+                    return
+                _LOGGER.warning( "using cached data of failed repository: %s", repo_item["name"] )
+            _LOGGER.info( "item found: %s", row )
+            with tracing.span( "csv.write_row" ):
+                writer.writerow( row )
+
+        limits = AsyncLimits( jobs, http_limit, subprocess_limit )
+        scrape_coroutine = scrape_repositories_async( api, listing_writer.add, write_result, stats_timeout,
+                                                      scrape_window( jobs ) )
+        updated_rows = run_async( scrape_coroutine, limits )
+
+    run_journal = scrapestate.get_run_journal()
+    for repoName, row in updated_rows.items():
+        run_journal.done( repoName, row )
+    if missing_repos:
+        ## output would be truncated -- previous output is kept
+        os.remove( tmp_csv_path )
+        _LOGGER.warning( "output not updated, no data of %s repositories: %s", len( missing_repos ), missing_repos )
+        return
+    ## output is replaced only when all repositories have data
+    with tracing.span( "csv.write_final" ):
+        write_final_csv( tmp_csv_path, scrapestate.OUTPUT_CSV, updated_rows )
+    _LOGGER.info( "output stored to file: %s", scrapestate.OUTPUT_CSV )
+    if not run_journal.failures:
+        ## failed repositories are retried by resumed run
+        run_journal.complete()
+
+
+## limits of running event loop (see 'run_async()')
+ASYNC_LIMITS = None
+
+
+class AsyncLimits():
+    """Limits of concurrently scraped repositories, HTTP requests and subprocesses.
+
+    Semaphores are bound to event loop, so they are created by 'run_async()'
+    inside of running loop.
+    """
+
+    ## jobs -- number of repositories, 0 means no limit
+    def __init__(self, jobs=0, http_limit=8, subprocess_limit=16):
+        self.jobs             = jobs
+        self.http_limit       = http_limit
+        self.subprocess_limit = subprocess_limit
+        self.repos      = None
+        self.http       = None
+        self.subprocess = None
+
+    def create_semaphores(self):
+        self.repos      = asyncio.Semaphore( self.jobs ) if self.jobs > 0 else contextlib.nullcontext()
+        self.http       = asyncio.Semaphore( max( 1, self.http_limit ) )
+        self.subprocess = asyncio.Semaphore( max( 1, self.subprocess_limit ) )
+
+
+## run coroutine in new event loop and return its result
+## HTTP requests, git and cloc are run by coroutines only, so it is blocking wrapper for
+## synchronous entry points (scraping, plan, pruning of mirrors)
+def run_async( coroutine, limits=None ):
+    if limits is None:
+        limits = AsyncLimits()
+
+    async def run_limited():
+        global ASYNC_LIMITS                      # pylint: disable=W0603
+        limits.create_semaphores()
+        ASYNC_LIMITS = limits
+        try:
+            return await coroutine
+        finally:
+            ASYNC_LIMITS = None
+            client = scrapestate.get_http_client()
+            if hasattr( client, "close_loop_connections" ):
+                client.close_loop_connections()
+
+    return asyncio.run( run_limited() )
+
+
+## max number of repositories in flight, whole page is scraped while next one is read
+def scrape_window( jobs ):
+    if jobs > 0:
+        return scrapestate.REPOS_PAGE_SIZE + jobs
+    return 2 * scrapestate.REPOS_PAGE_SIZE
+
+
+## scrape repositories concurrently, resolve deferred statistics
+## return dict: repo name -> updated CSV row
+## time of cold run is bounded by the slowest repository instead of sum of all of them,
+## memory is bounded by 'window' instead of number of repositories in account
+## add_listing_item -- function called for each listed repository
+## add_result -- function called with repo item and CSV row (None on failure) in listing order
+## window -- max number of repositories in flight
+async def scrape_repositories_async( api, add_listing_item, add_result, stats_timeout, window ):
+    ## cache file is read outside of event loop
+    await asyncio.to_thread( scrapestate.get_loc_cache().load )
+
+    if api == "graphql":
+        read_item = read_repo_info_graphql
+    else:
+        read_item = read_repo_info
+
+    in_flight = collections.deque()
+    try:
+        ## repositories are scraped while next pages of listing are read
+        async for repo_item in iterate_listing( api ):
+            add_listing_item( repo_item )
+            task = asyncio.create_task( read_repo_info_safe( read_item, repo_item ) )
+            in_flight.append( ( repo_item, task ) )
+            if len( in_flight ) >= window:
+                done_item, done_task = in_flight.popleft()
+                add_result( done_item, await done_task )
+        while in_flight:
+            done_item, done_task = in_flight.popleft()
+            add_result( done_item, await done_task )
+    finally:
+        for _, task in in_flight:
+            task.cancel()
+
+    ## resolve statistics that were not ready during scraping
+    updated_rows = {}
+    if len( scrapestate.get_deferred_queue() ) > 0:
+        updated_rows = await resolve_deferred( stats_timeout )
+    return updated_rows
+
+
+## yield repositories of account from REST or GraphQL API
+def iterate_listing( api ):
+    if api == "graphql":
+        return githubgraphql.iterate_repositories( read_graphql, scrapestate.GITHUB_USER, scrapestate.REPOS_PAGE_SIZE )
+    return iterate_repositories( scrapestate.REPOS_URL )
+
+
+## return list of all repositories of account
+async def read_listing( api ):
+    return [ repo_item async for repo_item in iterate_listing( api ) ]
+
+
+## return CSV row of repository from cache (data of previous run), None if not cached
+def get_cached_row( repoName ):
+    cached_data = scrapestate.get_repo_cache().get( repoName )
+    if cached_data is None:
+        return None
+    return scrapestate.get_row_from_dict( cached_data )
+
+
+def store_caches():
+    scrapestate.get_repo_cache().commit()
+    if scrapestate.LOC_CACHE is not None:
+        scrapestate.LOC_CACHE.store()
+
+
+## poll deferred requests, return dict: repo name -> updated CSV row
+async def resolve_deferred( timeout ):
+    await scrapestate.get_deferred_queue().poll( timeout )
+    with scrapestate.DEFERRED_LOCK:
+        updated_rows = dict( scrapestate.DEFERRED_ROWS )
+        scrapestate.DEFERRED_ROWS.clear()
+    return updated_rows
+
+
+## copy temporary CSV to output replacing rows with updated values
+def write_final_csv( tmp_csv_path, output_path, updated_rows ):
+    if not updated_rows:
+        os.replace( tmp_csv_path, output_path )
+        return
+    new_path = output_path + "_new"
+    with open( tmp_csv_path, 'r', encoding='UTF8', newline='' ) as in_file, \
+         open( new_path, 'w', encoding='UTF8' ) as out_file:
+        reader = csv.reader( in_file, delimiter=',' )
+        writer = csv.writer( out_file, delimiter=',', quoting=csv.QUOTE_ALL )
+        for row in reader:
+            new_row = updated_rows.get( row[0] )
+            if new_row is not None:
+                row = new_row
+            writer.writerow( row )
+    os.replace( new_path, output_path )
+    os.remove( tmp_csv_path )
+
+
+## yield repositories page by page following 'Link: rel="next"' header
+## raises exception if any page can't be read, so results are never silently truncated
+async def iterate_repositories( url_path ):
+    next_url = url_path
+    while next_url:
+        response = await read_url( next_url )
+        if response is None or response[0] != 200:
+            raise Exception( f"unable to read repositories page: {next_url}" )
+        page_data = response[1]
+        links = scrapestate.parse_link_header( response[2].get( "Link" ) )
+        next_url = links.get( "next" )
+        for repo_item in page_data:
+            yield repo_item
+
+
+## remove mirrors of repositories that no longer exist in account
+def prune_mirrors():
+    repoUrls = [ repo_item["clone_url"] for repo_item in run_async( read_listing( "rest" ) ) ]
+    removed = scrapestate.get_mirror_cache().prune( repoUrls )
+    _LOGGER.info( "removed %s mirrors", len( removed ) )
+
+
+## fetch only repositories listing and check which repositories would be scraped (nothing is cloned)
+## return dict with stale repositories and estimated cost of refresh
+def plan_refresh( api="rest" ):
+    requests_before = scrapestate.get_rate_limiter().stats()["requests"]
+    listing = run_async( read_listing( api ) )
+    listing_requests = scrapestate.get_rate_limiter().stats()["requests"] - requests_before
+
+    stale, removed = scrapestate.check_staleness( listing )
+    stale_list = [ { "name": item["name"],
+                     "reason": reason,
+                     "fork": item["fork"],
+                     "size_kb": item.get( "size" ) } for item, reason in stale ]
+    return { "date": time.strftime( "%Y-%m-%d %H:%M:%S" ),
+             "api": api,
+             "repositories": len( listing ),
+             "listing_requests": listing_requests,
+             "stale": stale_list,
+             "removed": removed,
+             "cost": estimate_cost( stale, api ) }
+
+
+def print_plan( plan ):
+    reasons = collections.Counter( item["reason"] for item in plan["stale"] )
+    reasons = ", ".join( f"{key}: {value}" for key, value in sorted( reasons.items() ) )
+    print( "repositories: {}, stale: {} ({}), removed: {}".format( plan["repositories"], len( plan["stale"] ),
+                                                                  reasons, len( plan["removed"] ) ) )
+    for item in plan["stale"]:
+        print( "    {} {}".format( item["name"], item["reason"] ) )
+    for name in plan["removed"]:
+        print( "    {} removed".format( name ) )
+    print( "estimated cost: {}".format( plan["cost"] ) )
+    print( "listing requests: {}".format( plan["listing_requests"] ) )
+
+
+## return dict with estimated number of API requests and git operations needed to refresh stale repositories
+## 'download_kb' is sum of sizes of repositories without mirror (fetches of existing mirrors are incremental)
+def estimate_cost( stale, api ):
+    cost = { "api_requests": 0, "ls_remote": 0, "clones": 0, "fetches": 0, "download_kb": 0 }
+    mirror_cache = scrapestate.get_mirror_cache()
+    for item, reason in stale:
+        if reason == "metadata":
+            if api != "graphql":
+                cost["ls_remote"] += 1
+            continue
+        if api != "graphql":
+            ## commits statistics (GraphQL listing already contains commits number)
+            cost["api_requests"] += 1
+        if item["fork"] is True:
+            if api != "graphql":
+                cost["ls_remote"] += 1
+            continue
+        if reason == "code" and api != "graphql":
+            cost["ls_remote"] += 1
+        if os.path.isdir( mirror_cache.mirror_path( item["clone_url"] ) ):
+            cost["fetches"] += 1
+        else:
+            cost["clones"] += 1
+            cost["download_kb"] += item.get( "size" ) or 0
+    return cost
+
+
+## returns None on failure instead of raising, so single repository does not break whole run
+## result is recorded in journal, repositories finished by resumed run are not scraped again
+async def read_repo_info_safe( read_func, repo_data ):
+    repoName = repo_data["name"]
+    row = scrapestate.get_run_journal().rows.get( repoName )
+    if row is not None:
+        return row
+    try:
+        async with ASYNC_LIMITS.repos:
+            row = await read_func( repo_data )
+    except Exception as exc:      # pylint: disable=W0703
+        _LOGGER.exception( "failed to read repository: %s", repoName )
+        checkpoint = record_result( repoName, None, f"{type(exc).__name__}: {exc}" )
+        row = None
+    else:
+        checkpoint = record_result( repoName, row, "unable to read repository data" )
+    if checkpoint:
+        ## caches are written outside of event loop
+        await asyncio.to_thread( store_caches )
+    return row
+
+
+## store result in journal, return True if caches should be stored (every 'CHECKPOINT_INTERVAL' repositories)
+## row waiting for deferred statistics is journaled after statistics are resolved
+def record_result( repoName, row, error ):
+    if row is None:
+        records_num = scrapestate.get_run_journal().failed( repoName, error )
+    else:
+        with scrapestate.DEFERRED_LOCK:
+            if repoName in scrapestate.DEFERRED_NAMES:
+                return False
+        records_num = scrapestate.get_run_journal().done( repoName, row )
+    return records_num % scrapestate.CHECKPOINT_INTERVAL == 0
+
+
+async def read_repo_info( repo_data ):
+    repoName = repo_data["name"]
+    cached_data = scrapestate.get_repo_cache().get( repoName )
+    if is_cache_valid( repo_data, cached_data ):
+        ## cache valid
+        return scrapestate.get_row_from_dict( cached_data )
+
+    if await is_code_unchanged( repo_data, cached_data ):
+        ## only metadata changed (e.g. stars or description) -- no need to clone
+        _LOGGER.info( "code not changed, refreshing metadata: %s", repoName )
+        cached_data.update( scrapestate.get_repo_metadata( repo_data ) )
+        scrapestate.get_repo_cache().put( repoName, cached_data )
+        return scrapestate.get_row_from_dict( cached_data )
+    
+    _LOGGER.info( "cache not found, scraping: %s", repoName )
+    cached_data = await scrap_repo_info( repo_data )
+    if cached_data is None:
+        ## unable to scrap data
+        return None
+    scrapestate.get_repo_cache().put( repoName, cached_data )
+    return scrapestate.get_row_from_dict( cached_data )
+
+
+## read repository info using data received from GraphQL API
+## commits number and HEAD SHA are already present, so only lines of code may need counting
+async def read_repo_info_graphql( repo_data ):
+    repoName = repo_data["name"]
+    cached_data = scrapestate.get_repo_cache().get( repoName )
+
+    headSha = repo_data["head_sha"]
+    if cached_data is not None and headSha and cached_data.get( "head_sha" ) == headSha:
+        ## code not changed
+        linesOfCode = cached_data["lines_of_code"]
+    elif repo_data["fork"] is False:
+        _LOGGER.info( "code changed, counting lines: %s", repoName )
+        linesOfCode, countedSha = await count_lines( repo_data["clone_url"] )
+        if countedSha != headSha:
+            ## pushed in the meantime or counting failed
+            headSha = countedSha
+    else:
+        linesOfCode = ""
+
+    repo_info = scrap_repo_info_graphql( repo_data, linesOfCode, headSha )
+    if repo_info != cached_data:
+        scrapestate.get_repo_cache().put( repoName, repo_info )
+    return scrapestate.get_row_from_dict( repo_info )
+
+
+## return dict of the same shape as 'scrap_repo_info()'
+def scrap_repo_info_graphql( repo_data, linesOfCode, headSha ):
+    repo_info = scrapestate.get_repo_metadata( repo_data )
+    repo_info.update( { "name": repo_data["name"],
+                        "commits_count": repo_data["commits_count"],
+                        "lines_of_code": linesOfCode,
+                        "head_sha": headSha
+                        } )
+    return repo_info
+
+
+async def scrap_repo_info( repo_data ):
+#         print( json.dumps(repo_data, indent=4) )
+    repoName = repo_data["name"]
+
+    ## read commits number
+    commitsNum = await read_commits_count( repo_data )
+    if commitsNum is None:
+        return None
+    
+    ## clone repository and count lines
+    linesOfCode = ""
+    clone_url = repo_data["clone_url"]
+    forked = repo_data["fork"]
+    if forked is False:
+        linesOfCode, headSha = await count_lines( clone_url )
+    else:
+        async with ASYNC_LIMITS.subprocess:
+            headSha = await scrapestate.get_mirror_cache().remote_head( clone_url )
+
+    return make_repo_info( repo_data, commitsNum, linesOfCode, headSha )
+
+
+## return cache entry of scraped repository
+## entry waiting for deferred statistics is marked with 'commits_pending', so it is not treated as valid
+## until the statistics are resolved
+def make_repo_info( repo_data, commitsNum, linesOfCode, headSha ):
+    repoName = repo_data["name"]
+    repo_info = scrapestate.get_repo_metadata( repo_data )
+    repo_info.update( { "name": repoName,
+                        "commits_count": commitsNum,
+                        "lines_of_code": linesOfCode,
+                        "head_sha": headSha
+                        } )
+    with scrapestate.DEFERRED_LOCK:
+        if repoName in scrapestate.DEFERRED_NAMES:
+            repo_info[ "commits_pending" ] = True
+    return repo_info
+
+
+## read number of owner's commits from statistics endpoint
+## if statistics are not ready yet (202) request is deferred and empty value is returned
+async def read_commits_count( repo_data ):
+    statsUrl = repo_data["url"] + "/stats/contributors"
+    response = await read_url( statsUrl )
+    return get_commits_count( repo_data, statsUrl, response )
+
+
+## return commits number from response of statistics endpoint, None on error
+## if statistics are not ready yet (202) request is deferred and empty value is returned
+def get_commits_count( repo_data, statsUrl, response ):
+    if response is None:
+        return None
+
+    repoName = repo_data["name"]
+    if response[0] == 202:
+        def on_ready( stats_data ):
+            update_commits_count( repoName, get_stats_commits( stats_data ) )
+
+        async def on_expired():
+            ## fallback to less accurate source
+            update_commits_count( repoName, await read_contributors_commits( repo_data ) )
+
+        with scrapestate.DEFERRED_LOCK:
+            scrapestate.DEFERRED_NAMES.add( repoName )
+        scrapestate.get_deferred_queue().add( statsUrl, on_ready, on_expired )
+        return ""
+
+    return get_stats_commits( response[1] )
+
+
+def get_stats_commits( stats_data ):
+    if not stats_data:
+        return ""
+    for authorStats in stats_data:
+        authorData = authorStats.get( 'author' ) or {}
+        if authorData.get( 'login' ) == scrapestate.GITHUB_USER:
+            return authorStats['total']
+    return ""
+
+
+## read number of commits from 'contributors_url'
+async def read_contributors_commits( repo_data ):
+    contribUrl = repo_data["contributors_url"]
+    response = await read_url( contribUrl )
+    if response is None:
+        return None
+
+    ## resp_status = response[0]
+    resp_data = response[1]
+
+    for commiterData in resp_data:
+        authorName = commiterData['login']
+        if authorName == scrapestate.GITHUB_USER:
+            return commiterData['contributions']
+    return ""
+
+
+## store commits number resolved after repository was scraped
+## if commits number could not be read, entry stays pending, so it is scraped again in next run
+def update_commits_count( repoName, commitsNum ):
+    cached_data = scrapestate.get_repo_cache().get( repoName )
+    if cached_data is None:
+        return
+    if commitsNum is None:
+        commitsNum = ""
+    else:
+        cached_data.pop( "commits_pending", None )
+    cached_data["commits_count"] = commitsNum
+    scrapestate.get_repo_cache().put( repoName, cached_data )
+    with scrapestate.DEFERRED_LOCK:
+        scrapestate.DEFERRED_ROWS[ repoName ] = scrapestate.get_row_from_dict( cached_data )
+        scrapestate.DEFERRED_NAMES.discard( repoName )
+
+
+## check if HEAD of remote repository is the same as when cache was created
+async def is_code_unchanged( item, cached_data ):
+    if cached_data is None or cached_data.get( "commits_pending" ):
+        return False
+    cachedSha = cached_data.get( "head_sha" )
+    if not cachedSha:
+        return False
+    async with ASYNC_LIMITS.subprocess:
+        remoteSha = await scrapestate.get_mirror_cache().remote_head( item["clone_url"] )
+    return remoteSha == cachedSha
+
+
+def is_cache_valid( item, cached_data ):
+    if cached_data is None:
+        return False
+    if cached_data.get( "commits_pending" ):
+        ## statistics were not resolved
+        return False
+    if cached_data["updated_at"] != item["updated_at"]:
+        return False
+    if cached_data["pushed_at"] != item["pushed_at"]:
+        return False
+    return True
+
+
+## return tuple: (lines of code, SHA of counted HEAD)
+async def count_lines( repoUrl ):
+    _LOGGER.info( "counting lines for: %s", repoUrl )
+    mirror_cache = scrapestate.get_mirror_cache()
+    loc_cache    = scrapestate.get_loc_cache()
+    ## mirror is updated incrementally, so only changed objects are downloaded
+    async with ASYNC_LIMITS.subprocess:
+        with tracing.span( "count_lines.clone", url=repoUrl ):
+            mirrorPath = await mirror_cache.update( repoUrl )
+    if mirrorPath is None:
+        _LOGGER.warning( "unable to clone repository: %s", repoUrl )
+        return ( "", None )
+
+    async with ASYNC_LIMITS.subprocess:
+        headSha = await mirror_cache.head_sha( mirrorPath )
+        ## only files not counted before are passed to cloc
+        with tracing.span( "count_lines.loc", url=repoUrl, engine=loc_cache.engine ):
+            linesOfCode = await loc_cache.count_tree( mirror_cache, mirrorPath )
+    if linesOfCode == "":
+        _LOGGER.warning( "unable to cloc repository: %s", repoUrl )
+        ## do not store SHA, so counting will be repeated in next run
+        return ( "", None )
+    return ( linesOfCode, headSha )
+
+
+## return tuple: (status_code, content, headers)
+## clients without coroutines (e.g. 'requests') are called in threads
+async def read_url_data( url_path, headers=None ):
+    ## shared client keeps connections alive between requests
+    client = scrapestate.get_http_client()
+    with tracing.span( "http.read_url_data" ):
+        if hasattr( client, "get_async" ):
+            return await client.get_async( url_path, headers )
+        return await asyncio.to_thread( client.get, url_path, headers )
+
+
+def write_text( content, outputPath ):
+    with open( outputPath, 'wt' ) as fp:
+        fp.write( content )
+
+
+## return tuple: (status_code, content, headers)
+async def post_url_data( url_path, data, headers=None ):
+    client = scrapestate.get_http_client()
+    if hasattr( client, "post_async" ):
+        return await client.post_async( url_path, data, headers )
+    return await asyncio.to_thread( client.post, url_path, data, headers )
+
+
+## send request respecting rate limit, retry with backoff on 403/429/5xx
+## post_data -- if given, POST request is sent
+## waiting for rate limit and for free HTTP slot is traced separately from request
+async def read_url_data_scheduled( url_path, headers=None, post_data=None ):
+    attempt = 0
+    while True:
+        with tracing.span( "http.wait_rate_limit" ):
+            await scrapestate.get_rate_limiter().acquire_async()
+        with tracing.span( "http.wait_slot" ):
+            await ASYNC_LIMITS.http.acquire()
+        try:
+            if post_data is None:
+                response = await read_url_data( url_path, headers )
+            else:
+                response = await post_url_data( url_path, post_data, headers )
+        finally:
+            ASYNC_LIMITS.http.release()
+        delay = scrapestate.get_rate_limiter().process_response( response[0], response[2], attempt )
+        if delay is None:
+            return response
+        _LOGGER.warning( "got status %s, retrying in %.1fs: %s", response[0], delay, url_path )
+        with tracing.span( "http.wait_retry" ):
+            await scrapestate.get_rate_limiter().wait_async( delay )
+        attempt += 1
+
+
+## send conditional request and reuse cached body if server responds with 304
+## cache files are read and written outside of event loop
+async def read_url_data_cached( url_path, use_cache=True ):
+    http_cache = scrapestate.get_http_cache()
+    if use_cache is False or http_cache.enabled is False:
+        return await read_url_data_scheduled( url_path )
+
+    cached_entry = await asyncio.to_thread( http_cache.get, url_path )
+    request_headers = http_cache.conditional_headers( cached_entry )
+    response = await read_url_data_scheduled( url_path, request_headers )
+
+    response_status = response[0]
+    if response_status == 304 and cached_entry is not None:
+        _LOGGER.debug( "not modified, using cached response: %s", url_path )
+        return http_cache.use( url_path, cached_entry )
+
+    http_cache.count_miss()
+    if response_status == 200:
+        await asyncio.to_thread( http_cache.store, url_path, response )
+    return response
+
+
+## send GraphQL query, return 'data' field of response
+async def read_graphql( query, variables ):
+    token = os.environ.get( "GITHUB_TOKEN" )
+    if not token:
+        raise githubgraphql.GraphQLError( "GraphQL API requires token in GITHUB_TOKEN environment variable" )
+    headers = { "Authorization": "bearer " + token,
+                "Content-Type": "application/json" }
+    body = json.dumps( { "query": query, "variables": variables } ).encode()
+    _LOGGER.debug( "reading graphql: %s", variables )
+    response = await read_url_data_scheduled( githubgraphql.GRAPHQL_URL, headers, body )
+    if response[0] != 200:
+        raise githubgraphql.GraphQLError( f"got status {response[0]}: {response[1]}" )
+    response_data = json.loads( response[1] )
+    errors = response_data.get( "errors" )
+    if errors:
+        raise githubgraphql.GraphQLError( f"query failed: {errors}" )
+    return response_data[ "data" ]
+
+
+## return list: [status_code, parsed_json, headers] or None on error
+## status 202 (accepted) and 204 (no content) are returned with None data
+## use_cache -- set to False to bypass HTTP response cache
+async def read_url( url_path, use_cache=True ):
+    print( "reading url:", url_path )
+    ## includes cache access and waits (traced by 'http.wait_*' spans)
+    with tracing.span( "http.read_url" ):
+        response = await read_url_data_cached( url_path, use_cache )
+    return parse_response( response )
+
+
+## return list: [status_code, parsed_json, headers] or None on error
+def parse_response( response ):
+    response_status = response[0]
+    if response_status == 202:
+        ## accepted: correct request but data is computed in background
+        ## caller has to request it again later
+        return [ response_status, None, response[2] ]
+
+    if response_status == 204:
+        ## no content (e.g. statistics of empty repository)
+        return [ response_status, None, response[2] ]
+
+    response_data = response[1]
+    data_dict = json.loads( response_data )
+
+    if response_status != 200:
+        print( "data:" )
+        pprint.pprint( data_dict )
+
+        print( "response headers:" )
+        header_dict = dict( response[2] )
+        pprint.pprint( header_dict )
+
+        mess = data_dict.get( "message" , "<no message field>")
+        _LOGGER.error( "message: %s status: %s", mess, response_status )
+        return None
+
+    return [ response_status, data_dict, response[2] ]
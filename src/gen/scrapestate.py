@@ -0,0 +1,386 @@
+import logging
+import os
+import threading
+import time
+import json
+
+
+_LOGGER = logging.getLogger(__name__)
+
+SCRIPT_DIR = os.path.dirname(__file__)      ## full path to script's directory
+
+TMP_DIR        = os.path.join( SCRIPT_DIR, os.pardir, os.pardir, "tmp" )
+CACHE_DIR      = os.path.join( TMP_DIR, "cache" )
+CACHE_REPO_DIR = os.path.join( CACHE_DIR, "repo" )         ## legacy, one pickle per repository
+CACHE_REPO_DB  = os.path.join( CACHE_DIR, "repos.sqlite" )
+CACHE_HTTP_DIR = os.path.join( CACHE_DIR, "http" )
+CACHE_MIRROR_DIR = os.path.join( CACHE_DIR, "mirror" )
+CACHE_LOC_PATH   = os.path.join( CACHE_DIR, "loc_blobs_{}.pickle" )
+CACHE_JOURNAL_PATH = os.path.join( CACHE_DIR, "run_journal.jsonl" )
+CACHE_LISTING_DIR  = os.path.join( CACHE_DIR, "listing" )
+
+OUTPUT_CSV = os.path.join( TMP_DIR, "github_repos.csv" )
+OUTPUT_CSV = os.path.abspath( OUTPUT_CSV )
+
+
+GITHUB_USER = "anetczuk"
+GITHUB_PROFILE_LINK = "https://github.com/anetczuk"
+
+## GitHub does not return more than 100 items per page
+REPOS_PAGE_SIZE = 100
+
+## repositories sorted by creation date, ascending
+REPOS_URL = "https://api.github.com/users/{}/repos?per_page={}&sort=created&direction=asc".format( GITHUB_USER, REPOS_PAGE_SIZE )
+
+## HTTP client used to send requests: 'requests', 'pycurl' or 'async' (see 'httpclient.BACKENDS')
+HTTP_BACKEND = "requests"
+
+## objects below are created on first use by 'get_*()' functions, so commands reading
+## only caches do not import modules used for scraping
+
+## responses are validated by 'ETag' and 'Last-Modified' headers
+HTTP_CACHE = None
+
+## if False, cached responses are not used
+HTTP_CACHE_ENABLED = True
+
+## max size of HTTP response cache in bytes
+HTTP_CACHE_SIZE = 64 * 1024 * 1024
+
+## requests are throttled according to 'X-RateLimit-*' headers
+RATE_LIMITER = None
+
+## number of retries of request failed with 403/429/5xx status
+MAX_RETRIES = 5
+
+## statistics answered with '202 Accepted' are polled after all repositories are processed
+DEFERRED_QUEUE = None
+DEFERRED_LOCK  = threading.Lock()
+DEFERRED_ROWS  = {}
+DEFERRED_NAMES = set()      ## repositories waiting for deferred statistics
+
+## bare repositories used to count lines of code
+MIRROR_CACHE = None
+
+## cached data of repositories
+REPO_CACHE = None
+
+## lines of code of each file blob
+LOC_CACHE = None
+
+## engine counting lines of code: 'cloc' or 'builtin' (see 'linecounter' module), each one has separate cache
+LOC_ENGINE = "cloc"
+
+## finished and failed repositories of current run, allows to resume interrupted run
+RUN_JOURNAL = None
+
+## caches are stored every given number of processed repositories
+CHECKPOINT_INTERVAL = 20
+
+## snapshots of raw repositories listing (for offline reprocessing)
+LISTING_ARCHIVE = None
+
+## number of kept listing snapshots
+LISTING_KEEP = 5
+
+
+## return shared client of selected backend
+def get_http_client():
+    import httpclient                           # pylint: disable=C0415
+    return httpclient.get_client( HTTP_BACKEND )
+
+
+def get_http_cache():
+    global HTTP_CACHE                           # pylint: disable=W0603
+    if HTTP_CACHE is None:
+        import httpcache                        # pylint: disable=C0415
+        HTTP_CACHE = httpcache.ResponseCache( CACHE_HTTP_DIR, HTTP_CACHE_SIZE )
+        HTTP_CACHE.enabled = HTTP_CACHE_ENABLED
+    return HTTP_CACHE
+
+
+def get_rate_limiter():
+    global RATE_LIMITER                         # pylint: disable=W0603
+    if RATE_LIMITER is None:
+        import ratelimit                        # pylint: disable=C0415
+        RATE_LIMITER = ratelimit.RateLimitScheduler( max_retries=MAX_RETRIES )
+    return RATE_LIMITER
+
+
+def get_deferred_queue():
+    global DEFERRED_QUEUE                       # pylint: disable=W0603
+    if DEFERRED_QUEUE is None:
+        # pylint: disable=C0415
+        import deferred
+        import scraper
+        DEFERRED_QUEUE = deferred.DeferredQueue( lambda url_path: scraper.read_url( url_path ) )
+    return DEFERRED_QUEUE
+
+
+def get_mirror_cache():
+    global MIRROR_CACHE                         # pylint: disable=W0603
+    if MIRROR_CACHE is None:
+        import gitmirror                        # pylint: disable=C0415
+        MIRROR_CACHE = gitmirror.MirrorCache( CACHE_MIRROR_DIR )
+    return MIRROR_CACHE
+
+
+def get_repo_cache():
+    global REPO_CACHE                           # pylint: disable=W0603
+    if REPO_CACHE is None:
+        import cachestore                       # pylint: disable=C0415
+        REPO_CACHE = cachestore.RepoCacheStore( CACHE_REPO_DB )
+    return REPO_CACHE
+
+
+def get_loc_cache():
+    global LOC_CACHE                            # pylint: disable=W0603
+    if LOC_CACHE is None:
+        import loccount                         # pylint: disable=C0415
+        LOC_CACHE = loccount.BlobLocCache( get_loc_cache_path(), LOC_ENGINE )
+    return LOC_CACHE
+
+
+def get_loc_cache_path():
+    return CACHE_LOC_PATH.format( LOC_ENGINE )
+
+
+def get_run_journal():
+    global RUN_JOURNAL                          # pylint: disable=W0603
+    if RUN_JOURNAL is None:
+        import runjournal                       # pylint: disable=C0415
+        RUN_JOURNAL = runjournal.RunJournal( CACHE_JOURNAL_PATH )
+    return RUN_JOURNAL
+
+
+def get_listing_archive():
+    global LISTING_ARCHIVE                      # pylint: disable=W0603
+    if LISTING_ARCHIVE is None:
+        import listingarchive                   # pylint: disable=C0415
+        LISTING_ARCHIVE = listingarchive.ListingArchive( CACHE_LISTING_DIR, LISTING_KEEP )
+    return LISTING_ARCHIVE
+
+
+## redirect output file and all caches to given directory (e.g. for benchmarks)
+def set_tmp_dir( tmp_dir ):
+    # pylint: disable=W0603
+    global TMP_DIR, CACHE_DIR, CACHE_REPO_DIR, CACHE_REPO_DB, CACHE_HTTP_DIR, CACHE_MIRROR_DIR, CACHE_LOC_PATH
+    global CACHE_JOURNAL_PATH, CACHE_LISTING_DIR, OUTPUT_CSV, HTTP_CACHE, MIRROR_CACHE, REPO_CACHE, LOC_CACHE
+    global RUN_JOURNAL, LISTING_ARCHIVE, DEFERRED_QUEUE, DEFERRED_ROWS, DEFERRED_NAMES
+    TMP_DIR          = tmp_dir
+    CACHE_DIR        = os.path.join( TMP_DIR, "cache" )
+    CACHE_REPO_DIR   = os.path.join( CACHE_DIR, "repo" )
+    CACHE_REPO_DB    = os.path.join( CACHE_DIR, "repos.sqlite" )
+    CACHE_HTTP_DIR   = os.path.join( CACHE_DIR, "http" )
+    CACHE_MIRROR_DIR = os.path.join( CACHE_DIR, "mirror" )
+    CACHE_LOC_PATH   = os.path.join( CACHE_DIR, "loc_blobs_{}.pickle" )
+    CACHE_JOURNAL_PATH = os.path.join( CACHE_DIR, "run_journal.jsonl" )
+    CACHE_LISTING_DIR  = os.path.join( CACHE_DIR, "listing" )
+    OUTPUT_CSV       = os.path.abspath( os.path.join( TMP_DIR, "github_repos.csv" ) )
+
+    ## objects are created again on next use
+    if REPO_CACHE is not None:
+        REPO_CACHE.close()
+    if RUN_JOURNAL is not None:
+        RUN_JOURNAL.close()
+    HTTP_CACHE      = None
+    MIRROR_CACHE    = None
+    REPO_CACHE      = None
+    LOC_CACHE       = None
+    RUN_JOURNAL     = None
+    LISTING_ARCHIVE = None
+    ## statistics pending in previous directory would be written to new output
+    with DEFERRED_LOCK:
+        DEFERRED_QUEUE = None
+        DEFERRED_ROWS  = {}
+        DEFERRED_NAMES = set()
+
+
+# ====================================================================
+
+
+## load repositories cache, on first use migrate data from legacy pickle files, return the cache
+def open_repo_cache():
+    repo_cache = get_repo_cache()
+    db_exists = os.path.isfile( CACHE_REPO_DB )
+    repo_cache.open()
+    if db_exists is False:
+        repo_cache.migrate_pickles( CACHE_REPO_DIR )
+    repo_cache.load_all()
+    return repo_cache
+
+
+## load repositories cache without modifying cache file (commands reading only caches)
+## return None if cache file does not exist
+def open_repo_cache_readonly():
+    if not os.path.isfile( CACHE_REPO_DB ):
+        return None
+    repo_cache = get_repo_cache()
+    repo_cache.open( readonly=True )
+    repo_cache.load_all()
+    return repo_cache
+
+
+## print state of caches, does not access network
+def print_cache_status():
+    status = {}
+    repo_cache = open_repo_cache_readonly()
+    if repo_cache is not None:
+        repo_stats = repo_cache.stats()
+        status[ "repo cache entries" ] = repo_stats[ "entries" ]
+        status[ "repo cache size" ]    = repo_stats[ "size" ]
+        incomplete = [ name for name in repo_cache.names() if is_entry_incomplete( repo_cache.get( name ) ) ]
+        status[ "incomplete entries" ] = len( incomplete )
+    else:
+        status[ "repo cache entries" ] = 0
+    status[ "http cache size" ] = get_http_cache().size()
+    ## 'gitmirror' module is not needed to count directories of mirrors
+    mirror_names = os.listdir( CACHE_MIRROR_DIR ) if os.path.isdir( CACHE_MIRROR_DIR ) else []
+    status[ "mirrors" ] = len( [ name for name in mirror_names if name.endswith( ".git" ) ] )
+    status[ "listing snapshots" ] = len( get_listing_archive().snapshots() )
+    loc_cache_path = get_loc_cache_path()
+    status[ "loc cache size" ] = os.path.getsize( loc_cache_path ) if os.path.isfile( loc_cache_path ) else 0
+    if os.path.isfile( OUTPUT_CSV ):
+        status[ "output modified" ] = time.strftime( "%Y-%m-%d %H:%M:%S", time.localtime( os.path.getmtime( OUTPUT_CSV ) ) )
+    for key, value in status.items():
+        print( f"{key}: {value}" )
+
+
+## return list of tuples: (repo name, reason) of repositories that will be scraped in next run
+## repositories listing is taken from HTTP cache (state of last run), so network is not accessed
+def list_stale_repos():
+    listing = read_cached_listing( REPOS_URL )
+    if listing is None:
+        _LOGGER.warning( "repositories listing not found in HTTP cache" )
+        listing = []
+    stale, removed = check_staleness( listing )
+    result = [ ( item["name"], reason ) for item, reason in stale ]
+    result += [ ( name, "removed" ) for name in removed ]
+    return result
+
+
+## return tuple: (list of (repo item, reason), sorted names of cached repositories missing in listing)
+def check_staleness( listing ):
+    cached_names = set()
+    repo_cache = open_repo_cache_readonly()
+    if repo_cache is not None:
+        cached_names = set( repo_cache.names() )
+    stale = []
+    for item in listing:
+        name = item["name"]
+        cached_data = repo_cache.get( name ) if name in cached_names else None
+        reason = get_stale_reason( item, cached_data )
+        if reason is not None:
+            stale.append( ( item, reason ) )
+        cached_names.discard( name )
+    return ( stale, sorted( cached_names ) )
+
+
+## return None if cached data is up to date, otherwise reason:
+## 'new' (not cached), 'code' (code changed, so clone and count is needed) or 'metadata' (only listing data changed)
+def get_stale_reason( item, cached_data ):
+    if cached_data is None:
+        return "new"
+    headSha = item.get( "head_sha" )
+    if headSha:
+        ## listing from GraphQL contains HEAD SHA, so change of code is detected exactly
+        if headSha != cached_data.get( "head_sha" ):
+            return "code"
+        metadata = get_repo_metadata( item )
+        metadata[ "commits_count" ] = item["commits_count"]
+        for key, value in metadata.items():
+            if cached_data.get( key ) != value:
+                return "metadata"
+        return None
+    if cached_data.get( "commits_pending" ):
+        return "commits"
+    if cached_data["pushed_at"] != item["pushed_at"]:
+        return "code"
+    if cached_data["updated_at"] != item["updated_at"]:
+        ## HEAD is checked with 'ls-remote' before cloning
+        return "metadata"
+    return None
+
+
+## return list of repositories from listing pages stored in HTTP cache or None if any page is missing
+def read_cached_listing( url_path ):
+    listing = []
+    while url_path:
+        entry = get_http_cache().get( url_path )
+        if entry is None:
+            return None
+        listing.extend( json.loads( entry["content"] ) )
+        url_path = None
+        for key, value in entry["headers"]:
+            if key.lower() == "link":
+                url_path = parse_link_header( value ).get( "next" )
+    return listing
+
+
+## parse 'Link' header, return dict: rel -> url
+def parse_link_header( link_value ):
+    links = {}
+    if not link_value:
+        return links
+    for link_item in link_value.split( "," ):
+        parts = link_item.split( ";" )
+        url = parts[0].strip()
+        if not url.startswith( "<" ) or not url.endswith( ">" ):
+            continue
+        url = url[1:-1]
+        for param in parts[1:]:
+            key, _, value = param.strip().partition( "=" )
+            if key.strip() == "rel":
+                for rel in value.strip( '" ' ).split():
+                    links[ rel ] = url
+    return links
+
+
+## lines of code were not counted (e.g. clone failed)
+def is_entry_incomplete( cached_data ):
+    if cached_data.get( "commits_pending" ):
+        return True
+    if "Fork" in cached_data.get( "category", "" ).split( "|" ):
+        return False
+    return not cached_data.get( "head_sha" ) or cached_data.get( "lines_of_code" ) == ""
+
+
+## return fields that can be taken directly from repositories listing
+def get_repo_metadata( repo_data ):
+    category = ""
+    category = append_string( category, repo_data["language"], "|" )
+    if repo_data["fork"] is True:
+        category = append_string( category, "Fork", "|" )
+
+    stars = repo_data["stargazers_count"]
+    if stars < 1:
+        stars = ""
+
+    return { "category": category,
+             "description": repo_data["description"],
+             "created_at": repo_data["created_at"],
+             "updated_at": repo_data["updated_at"],
+             "pushed_at": repo_data["pushed_at"],
+             "stars": stars
+            }
+
+
+def get_row_from_dict( data_dict ):
+    return [ data_dict["name"],
+             data_dict["category"],
+             data_dict["description"],
+             data_dict["created_at"],
+#              data_dict["updated_at"],
+             data_dict["pushed_at"],
+             data_dict["stars"],
+             data_dict["commits_count"],
+             data_dict["lines_of_code"]
+            ]
+
+
+def append_string( data1, data2, separator ):
+    if data1 is None:
+        return data2
+    if len(data1) < 1:
+        return data2
+    return data1 + separator + data2
@@ -0,0 +1,6 @@
+import os
+import sys
+
+
+## modules of 'src/gen' are imported by name (the same as scripts do)
+sys.path.insert( 0, os.path.join( os.path.dirname( __file__ ), os.pardir ) )
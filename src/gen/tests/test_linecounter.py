@@ -0,0 +1,37 @@
+import linecounter
+
+
+SCRIPT = b"""#!/usr/bin/env python3
+# comment
+
+print( "hello" )
+"""
+
+
+def test_detect_language_by_extension():
+    assert linecounter.detect_language( "src/main.py" ) == "Python"
+    assert linecounter.detect_language( "CMakeLists.txt" ) == "CMake"
+    assert linecounter.detect_language( "image.png" ) is None
+
+
+def test_detect_language_by_shebang():
+    assert linecounter.detect_language( "bin/tool", SCRIPT ) == "Python"
+    assert linecounter.detect_language( "bin/tool", "#!/bin/bash\necho\n" ) == "Bourne Again Shell"
+    assert linecounter.detect_language( "bin/tool", b"#!/usr/bin/python3.11 -u\n" ) == "Python"
+    assert linecounter.detect_language( "bin/tool", b"#!/usr/bin/env -S perl -w\n" ) == "Perl"
+
+
+def test_detect_language_without_shebang():
+    assert linecounter.detect_language( "bin/tool" ) is None
+    assert linecounter.detect_language( "LICENSE", b"MIT License\n" ) is None
+    assert linecounter.detect_language( "bin/tool", b"#!/usr/bin/unknown\n" ) is None
+    ## extension decides even if file has '#!' line
+    assert linecounter.detect_language( "notes.txt", SCRIPT ) is None
+
+
+def test_count_script_without_extension( tmp_path ):
+    script = tmp_path / "tool"
+    script.write_bytes( SCRIPT )
+    assert linecounter.count_blob( ( "key", "tool", SCRIPT ) ) == ( "key", 1 )
+    item = linecounter.count_file( str( script ) )
+    assert item[1:5] == ( "Python", 1, 2, 1 )
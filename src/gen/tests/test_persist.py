@@ -0,0 +1,39 @@
+import time
+
+import persist
+
+
+## versions made one day apart, from oldest to newest
+def make_versions( num ):
+    now = time.time()
+    return [ { "seq": seq, "time": now - ( num - seq ) * 86400, "digest": str( seq ) } for seq in range( 1, num + 1 ) ]
+
+
+def test_retention_keeps_newest_when_rules_disabled():
+    retention = persist.BackupRetention( keepLast=0, keepDaily=0, keepWeekly=0 )
+    assert retention.select( make_versions( 5 ) ) == [ 5 ]
+
+
+def test_retention_empty_versions():
+    retention = persist.BackupRetention( keepLast=0, keepDaily=0, keepWeekly=0 )
+    assert retention.select( [] ) == []
+
+
+def test_retention_keep_last():
+    retention = persist.BackupRetention( keepLast=2, keepDaily=0, keepWeekly=0 )
+    assert retention.select( make_versions( 5 ) ) == [ 4, 5 ]
+
+
+def test_backup_files_zero_retention_keeps_latest( tmp_path ):
+    input_file = tmp_path / "data.txt"
+    archive = str( tmp_path / "data.zip" )
+    retention = persist.BackupRetention( keepLast=0, keepDaily=0, keepWeekly=0 )
+    for content in [ "first", "second" ]:
+        input_file.write_text( content )
+        persist.backup_files( [ str( input_file ) ], archive, retention )
+
+    versions = persist.list_backups( archive )
+    assert [ version["seq"] for version in versions ] == [ 2 ]
+    restored = persist.restore_backup( archive, str( tmp_path / "out" ) )
+    with open( restored[0], 'r' ) as fp:
+        assert fp.read() == "second"
@@ -0,0 +1,198 @@
+import logging
+import os
+import threading
+import asyncio
+import time
+import math
+import json
+import functools
+
+
+_LOGGER = logging.getLogger(__name__)
+
+
+# ====================================================================
+
+
+class Span():
+    """Measures duration of block of code and passes it to tracer."""
+
+    __slots__ = ( "tracer", "name", "args", "start" )
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name   = name
+        self.args   = args
+        self.start  = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.tracer.add_span( self.name, self.start, time.perf_counter() - self.start, self.args )
+        return False
+
+
+class NullSpan():
+    """Span used when tracing is disabled, does nothing."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class Tracer():
+    """Collects spans and exports them in Chrome trace event format.
+
+    Trace can be opened in 'chrome://tracing' or 'https://ui.perfetto.dev'.
+    When disabled, 'span()' returns shared no-op object.
+
+    Spans are grouped in tracks: each asyncio task and each thread outside
+    of tasks has its own track (exported as 'tid'), so spans of concurrent
+    coroutines running in the same thread are properly nested.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self._spans = []
+        self._tracks = {}
+
+    def enable(self):
+        with self._lock:
+            self.enabled = True
+            self._origin = time.perf_counter()
+            self._spans  = []
+            self._tracks = {}
+
+    def disable(self):
+        self.enabled = False
+
+    def span(self, name, **args):
+        if self.enabled is False:
+            return NULL_SPAN
+        return Span( self, name, args )
+
+    def add_span(self, name, start, duration, args=None):
+        track_id, track_name = current_track()
+        with self._lock:
+            self._tracks[ track_id ] = track_name
+            self._spans.append( ( name, start, duration, track_id, args ) )
+
+    ## return list of events in Chrome trace format (complete events, times in microseconds)
+    def events(self):
+        pid = os.getpid()
+        with self._lock:
+            spans = list( self._spans )
+            tracks = dict( self._tracks )
+        events = []
+        for track_id, track_name in tracks.items():
+            events.append( { "name": "thread_name", "ph": "M", "pid": pid, "tid": track_id,
+                             "args": { "name": track_name } } )
+        for name, start, duration, track_id, args in spans:
+            event = { "name": name,
+                      "cat": name.split( "." )[0],
+                      "ph": "X",
+                      "ts": round( ( start - self._origin ) * 1000000, 3 ),
+                      "dur": round( duration * 1000000, 3 ),
+                      "pid": pid,
+                      "tid": track_id }
+            if args:
+                event[ "args" ] = args
+            events.append( event )
+        return events
+
+    def save(self, output_path):
+        trace = { "traceEvents": self.events(), "displayTimeUnit": "ms" }
+        with open( output_path, 'w' ) as fp:
+            json.dump( trace, fp )
+        _LOGGER.info( "trace stored to file: %s", output_path )
+
+    ## return dict: span name -> { count, total, p50, p95, max } (times in seconds)
+    def summary(self):
+        durations = {}
+        with self._lock:
+            for name, _, duration, _, _ in self._spans:
+                durations.setdefault( name, [] ).append( duration )
+        result = {}
+        for name, values in sorted( durations.items() ):
+            values.sort()
+            result[ name ] = { "count": len( values ),
+                               "total": sum( values ),
+                               "p50": percentile( values, 50 ),
+                               "p95": percentile( values, 95 ),
+                               "max": values[-1] }
+        return result
+
+    def format_summary(self):
+        lines = [ "{:<32} {:>7} {:>10} {:>10} {:>10} {:>10}".format( "stage", "count", "total [s]",
+                                                                   "p50 [ms]", "p95 [ms]", "max [ms]" ) ]
+        for name, data in self.summary().items():
+            lines.append( "{:<32} {:>7} {:>10.3f} {:>10.2f} {:>10.2f} {:>10.2f}".format( name, data[ "count" ], data[ "total" ],
+                                                                                       data[ "p50" ] * 1000,
+                                                                                       data[ "p95" ] * 1000,
+                                                                                       data[ "max" ] * 1000 ) )
+        return "\n".join( lines )
+
+
+## return tuple: (track id, track name) of current asyncio task or thread
+def current_track():
+    thread = threading.current_thread()
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        ## no event loop running in thread
+        task = None
+    if task is None:
+        return ( thread.ident, thread.name )
+    return ( id( task ), thread.name + "/" + task.get_name() )
+
+
+## nearest-rank percentile of sorted list
+def percentile( sorted_values, percent ):
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil( percent / 100.0 * len( sorted_values ) ) - 1
+    rank = min( max( rank, 0 ), len( sorted_values ) - 1 )
+    return sorted_values[ rank ]
+
+
+# ====================================================================
+
+
+## global tracer used by scraper modules
+TRACER = Tracer()
+
+
+def span( name, **args ):
+    return TRACER.span( name, **args )
+
+
+## decorator measuring each call of function
+def traced( name ):
+    def decorator( func ):
+        @functools.wraps( func )
+        def wrapper( *args, **kwargs ):
+            if TRACER.enabled is False:
+                return func( *args, **kwargs )
+            with Span( TRACER, name, None ):
+                return func( *args, **kwargs )
+        return wrapper
+    return decorator
+
+
+## replace function of module with traced version (for modules that should not depend on tracing)
+def trace_function( owner, attr_name, name=None ):
+    func = getattr( owner, attr_name )
+    if name is None:
+        name = getattr( owner, "__name__", "" ) + "." + attr_name
+    setattr( owner, attr_name, traced( name )( func ) )